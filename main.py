@@ -7,6 +7,7 @@ import sys
 import websockets
 
 import discord
+from necrobot import necrodb
 from necrobot.command.command import Command
 from necrobot.necrobot import Necrobot
 from necrobot.util import backoff, config, seedgen
@@ -22,14 +23,50 @@ def ready_client_events():
     # Called whenever a new message is posted in any channel on any server
     @client.event
     async def on_message(message):
-        cmd = Command(message)
-        await the_necrobot.execute(cmd)
+        if the_necrobot.accepts_message(message):
+            await the_necrobot.execute(Command(message))
 
     # Called when a new member joins any server
     @client.event
     async def on_member_join(member):
         await the_necrobot.on_member_join(member)
 
+    # Called when a member leaves (or is removed from) any server
+    @client.event
+    async def on_member_remove(member):
+        await the_necrobot.on_member_remove(member)
+
+    # Called when a member changes their name, roles, etc.
+    @client.event
+    async def on_member_update(before, after):
+        await the_necrobot.on_member_update(before, after)
+
+    # Called when a role is created, deleted, or edited
+    @client.event
+    async def on_server_role_create(role):
+        await the_necrobot.on_server_role_change(role)
+
+    @client.event
+    async def on_server_role_delete(role):
+        await the_necrobot.on_server_role_change(role)
+
+    @client.event
+    async def on_server_role_update(before, after):
+        await the_necrobot.on_server_role_change(after)
+
+    # Called when a channel is created, deleted, or edited
+    @client.event
+    async def on_channel_create(channel):
+        await the_necrobot.on_channel_create(channel)
+
+    @client.event
+    async def on_channel_delete(channel):
+        await the_necrobot.on_channel_delete(channel)
+
+    @client.event
+    async def on_channel_update(before, after):
+        await the_necrobot.on_channel_update(before, after)
+
 
 if __name__ == "__main__":
     # Prepend timestamps to stdout and stderr, and send output to logging
@@ -97,6 +134,9 @@ if __name__ == "__main__":
 # Initialize config file----------------------------------
     config.init('data/bot_config')
 
+# Open the database connection pool-----------------------
+    necrodb.init_pool()
+
 # Seed the random number generator------------------------
     seedgen.init_seed()
 
@@ -1,12 +1,28 @@
 # Represents a discord channel on which the bot can read commands. Holds a list of commands the bot will respond to on
 # this channel.
+#
+# Each BotChannel runs its commands strictly in order, one at a time, from its own queue; different channels run their
+# commands in parallel, so a slow command in one channel doesn't hold up any other channel. A subclass may split its
+# commands over several queues by overriding _command_queue_key (e.g. the PM channel keeps one queue per user).
+# A queue's worker exits whenever the queue runs empty, and is restarted by the next command; the queue itself stays,
+# so that commands still waiting for room in it are never stranded.
+
+import asyncio
+import logging
+import time
+
+from ..util import stats
+from ..util.config import Config
 
 
 class BotChannel(object):
     # necrobot: a necrobot.Necrobot object (the necrobot this is a channel for)
     def __init__(self, necrobot):
         self.necrobot = necrobot
-        self.command_types = []     # the list of command.CommandType that can be called on this channel
+        self._command_types = []        # the list of command.CommandType that can be called on this channel
+        self._command_lookup = {}       # maps each name (or alias) of a command in command_types onto its CommandType
+        self._command_queues = {}       # maps queue keys onto asyncio.Queues of (enqueue time, command.Command)
+        self._command_workers = {}      # maps queue keys onto the Futures running commands from _command_queues
 
     def refresh(self, channel):
         pass
@@ -15,15 +31,99 @@ class BotChannel(object):
     def client(self):
         return self.necrobot.client
 
+    @property
+    def command_types(self):
+        return self._command_types
+
+    # The number of commands waiting to be executed on this channel
+    @property
+    def command_queue_depth(self):
+        return sum(command_queue.qsize() for command_queue in self._command_queues.values())
+
+    @command_types.setter
+    def command_types(self, command_types):
+        self._command_types = []
+        self._command_lookup = {}
+        for cmd_type in command_types:
+            self.register_command(cmd_type)
+
+    # Adds the given command.CommandType to the commands that can be called on this channel
+    def register_command(self, cmd_type):
+        self._command_types.append(cmd_type)
+        for name in cmd_type.command_name_list:
+            self._command_lookup.setdefault(name, cmd_type)
+
     # Returns whether the user has access to admin commands for this channel
     def is_admin(self, discord_member):
         return self.necrobot.is_admin(discord_member) or self._virtual_is_admin(discord_member)
 
+    # Adds the given command to its queue; it will be executed after all commands queued before it with the same
+    # queue key. Waits only if the queue is full.
+    async def enqueue(self, command):
+        key = self._command_queue_key(command)
+        command_queue = self._command_queues.get(key)
+        if command_queue is None:
+            command_queue = asyncio.Queue(maxsize=Config.COMMAND_QUEUE_SIZE)
+            self._command_queues[key] = command_queue
+        await command_queue.put((time.monotonic(), command))
+        if self._command_queues.get(key) is not command_queue:
+            # stop_command_queue was called while we waited for room: drop this command, making room for the next one
+            # waiting on the same queue
+            self._drop_queued(command_queue)
+            return
+
+        # Start a worker if there is none (the last one may have run the queue empty while we waited for room)
+        command_worker = self._command_workers.get(key)
+        if command_worker is None or command_worker.done():
+            self._command_workers[key] = asyncio.ensure_future(self._run_command_queue(key, command_queue))
+        stats.observe('cmdqueue.depth', command_queue.qsize())
+
+    # Stop executing queued commands. Commands still in the queues, or waiting for room in them, are dropped. (If
+    # called from a command on this channel, that command runs to completion.)
+    def stop_command_queue(self):
+        command_queues = list(self._command_queues.values())
+        self._command_queues = {}
+        self._command_workers = {}
+        for command_queue in command_queues:
+            self._drop_queued(command_queue)
+
     # Attempts to execute the given command (if a command of its type is in command_types)
     async def execute(self, command):
-        for cmd_type in self.command_types:
+        cmd_type = self._command_lookup.get(command.command)
+        if cmd_type is not None:
             await cmd_type.execute(command)
 
     # Override to add more admins
     def _virtual_is_admin(self, discord_member):
         return False
+
+    # Override to run commands on more than one queue. Commands with the same key run in order, one at a time; commands
+    # with different keys run in parallel.
+    def _command_queue_key(self, command):
+        return None
+
+    # Empty the given queue, so that any enqueue blocked on it gets to run (and finds the queue stopped)
+    @staticmethod
+    def _drop_queued(command_queue):
+        while not command_queue.empty():
+            command_queue.get_nowait()
+            command_queue.task_done()
+
+    # Executes commands from the given queue, in order, until it runs empty or stop_command_queue is called
+    async def _run_command_queue(self, key, command_queue):
+        while self._command_queues.get(key) is command_queue:
+            if command_queue.empty():
+                del self._command_workers[key]
+                return
+
+            enqueue_time, command = command_queue.get_nowait()
+            stats.observe('cmdqueue.wait', time.monotonic() - enqueue_time)
+            try:
+                await self.execute(command)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.getLogger('discord').exception(
+                    'Exception while executing command "{0}".'.format(command.command))
+            finally:
+                command_queue.task_done()
@@ -12,6 +12,7 @@ class PMBotChannel(BotChannel):
             admin.Reboot(self),
             admin.Register(self),
             admin.RegisterAll(self),
+            admin.Stats(self),
             daily.DailyChar(self),
             daily.DailyResubmit(self),
             daily.DailyRules(self),
@@ -31,3 +32,8 @@ class PMBotChannel(BotChannel):
             racemake.MakePrivate(self),
             seedgen.RandomSeed(self),
         ]
+
+    # Each user's commands get their own queue, so that one user's slow command (e.g. a .dailyresubmit waiting on the
+    # database) doesn't hold up anyone else's
+    def _command_queue_key(self, command):
+        return command.author.id
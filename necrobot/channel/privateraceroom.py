@@ -17,12 +17,12 @@ class PrivateRaceRoom(RaceRoom):
         if admin_as_member not in self.permission_info.admins:
             self.permission_info.admins.append(admin_as_member)
 
-        self.command_types.append(privaterace.Add(self))
-        self.command_types.append(privaterace.Remove(self))
-        self.command_types.append(privaterace.MakeAdmin(self))
-        self.command_types.append(privaterace.ShowAdmins(self))
-        self.command_types.append(privaterace.NoPost(self))
-        self.command_types.append(privaterace.Post(self))
+        self.register_command(privaterace.Add(self))
+        self.register_command(privaterace.Remove(self))
+        self.register_command(privaterace.MakeAdmin(self))
+        self.register_command(privaterace.ShowAdmins(self))
+        self.register_command(privaterace.NoPost(self))
+        self.register_command(privaterace.Post(self))
 
     # A string to add to the race details ("Private")
     @property
@@ -63,13 +63,13 @@ class PrivateRaceRoom(RaceRoom):
     async def allow(self, member_or_role):
         read_permit = discord.PermissionOverwrite()
         read_permit.read_messages = True
-        await self.client.edit_channel_permissions(self.channel, member_or_role, read_permit)
+        await self.necrobot.outbound.edit_channel_permissions(self.channel, member_or_role, read_permit)
 
     # Restrict the member from seeing the channel
     async def deny(self, member_or_role):
         read_deny = discord.PermissionOverwrite()
         read_deny.read_messages = False
-        await self.client.edit_channel_permissions(self.channel, member_or_role, read_deny)
+        await self.necrobot.outbound.edit_channel_permissions(self.channel, member_or_role, read_deny)
 
     # True if the user has admin permissions for this race
     def _virtual_is_admin(self, member):
@@ -80,7 +80,7 @@ class PrivateRaceRoom(RaceRoom):
         # If this is a CoNDOR race, log the room text before closing
         if self.race_info.condor_race:
             outfile_name = ''
-            for racer in self.current_race.racers:
+            for racer in self.current_race.racers.values():
                 outfile_name += '{0}-'.format(racer.member.display_name)
             outfile_name += str(self.channel.id)
             await writechannel.write_channel(self.client, self.channel, outfile_name)
@@ -2,13 +2,17 @@
 
 import asyncio
 import datetime
+import logging
+import time
 
 from .botchannel import BotChannel
 from ..command import admin
 from ..command import race
 from ..race import raceinfo
 from ..race.race import Race
+from ..util.coalescingwriter import CoalescingWriter
 from ..util.config import Config
+from ..util.outbound import Priority
 from ..util import seedgen
 
 
@@ -26,6 +30,14 @@ class RaceRoom(BotChannel):
         self._mention_on_new_race = []          # A list of users that should be @mentioned when a rematch is created
         self._mentioned_users = []              # A list of users that were @mentioned when this race was created
         self._nopoke = False                    # When True, the .poke command fails
+        self._writer = CoalescingWriter(        # Buffers and merges text written to the room
+            self.necrobot.outbound, race_discord_channel, Config.RACE_WRITE_COALESCE_SEC)
+
+        self._leaderboard_version = 0           # Incremented on every call to update_leaderboard
+        self._leaderboard_future = None         # The Future publishing leaderboard updates, if any
+        self._leaderboard_stopped = False       # True once the room is closing; no more topic edits are made
+        self._published_topic = None            # The last leaderboard text set as the channel topic
+        self._last_topic_edit = None            # System clock time of the last topic edit
 
         self.command_types = [admin.Help(self),
                               race.Enter(self),
@@ -103,6 +115,16 @@ class RaceRoom(BotChannel):
 
     def refresh(self, channel):
         self._channel = channel
+        self._writer.channel = channel
+
+    # Drop any text written to the room but not yet sent, and stop updating the leaderboard (e.g., because the room is
+    # closing, and a topic edit would arrive after the channel is gone)
+    def discard_pending_writes(self):
+        self._writer.discard()
+        self._leaderboard_stopped = True
+        if self._leaderboard_future is not None:
+            self._leaderboard_future.cancel()
+            self._leaderboard_future = None
 
 # Coroutine methods ---------------------------------------------------
     # Set up the leaderboard etc. Should be called after creation; code not put into __init__ b/c coroutine
@@ -112,17 +134,24 @@ class RaceRoom(BotChannel):
         await self.write('Enter the race with `.enter`, and type `.ready` when ready. '
                          'Finish the race with `.done` or `.forfeit`. Use `.help` for a command list.')
 
-    # Write text to the raceroom. Return a Message for the text written
-    async def write(self, text):
-        await self.client.send_message(self._channel, text)
+    # Write text to the raceroom. Text written within a short time is merged into one message, unless immediate is
+    # True, in which case the text is sent at once (use this for countdowns and other timing-critical lines).
+    async def write(self, text, immediate=False):
+        return await self._writer.write(text, immediate)
 
-    # Updates the leaderboard
+    # Updates the leaderboard. Requests are coalesced: the topic is edited at most once every
+    # Config.TOPIC_UPDATE_INTERVAL_SEC, always with the latest leaderboard, and not at all if the text is unchanged.
     async def update_leaderboard(self):
-        await self.client.edit_channel(self._channel, topic=self._current_race.leaderboard)
+        if self._leaderboard_stopped:
+            return
+        self._leaderboard_version += 1
+        if self._leaderboard_future is None or self._leaderboard_future.done():
+            self._leaderboard_future = asyncio.ensure_future(self._publish_leaderboard())
 
     # Post the race result to the race channel
     async def post_result(self, text):
-        await self.client.send_message(self._race_manager.results_channel, text)
+        await self.necrobot.outbound.send_message(
+            self._race_manager.results_channel, text, priority=Priority.leaderboard)
 
 # Commands ------------------------------------------------------------
     async def set_post_result(self, do_post):
@@ -153,12 +182,12 @@ class RaceRoom(BotChannel):
         if self._current_race.complete:
             await self._make_new_race()
 
-    # Pause the race
-    async def pause(self):
+    # Pause the race (as of the given UTC datetime; defaults to now)
+    async def pause(self, sent_at=None):
         if self._current_race.during_race:
-            await self._current_race.pause()
+            await self._current_race.pause(sent_at)
             mention_str = ''
-            for racer in self._current_race.racers:
+            for racer in self._current_race.racers.values():
                 mention_str += '{}, '.format(racer.member.mention)
             mention_str = mention_str[:-2]
 
@@ -227,13 +256,11 @@ class RaceRoom(BotChannel):
         self._mention_on_new_race = []
 
         if self.race_info.seeded:
-            await self.client.send_message(
-                self._channel,
+            await self.write(
                 '{0}\nRace number {1} is open for entry. Seed: {2}.'.format(
                     mention_text, self._race_number, self.current_race.race_info.seed))
         else:
-            await self.client.send_message(
-                self._channel,
+            await self.write(
                 '{0}\nRace number {1} is open for entry.'.format(mention_text, self._race_number))
 
     # Checks to see whether the room should be cleaned.
@@ -262,6 +289,29 @@ class RaceRoom(BotChannel):
                         await self.close()
                         return
 
+    # Publishes the leaderboard until the published version is the latest one requested
+    async def _publish_leaderboard(self):
+        published_version = None
+        while published_version != self._leaderboard_version:
+            if self._last_topic_edit is not None:
+                wait_time = self._last_topic_edit + Config.TOPIC_UPDATE_INTERVAL_SEC - time.monotonic()
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+
+            published_version = self._leaderboard_version
+            topic = self._current_race.leaderboard
+            if topic != self._published_topic:
+                self._last_topic_edit = time.monotonic()
+                try:
+                    await self.necrobot.outbound.edit_channel(self._channel, topic=topic)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logging.getLogger('discord').exception(
+                        'Exception while updating the topic of #{0}.'.format(self._channel.name))
+                else:
+                    self._published_topic = topic
+
     # Implements a delay before pokes can happen again
     async def _run_nopoke_delay(self):
         await asyncio.sleep(Config.RACE_POKE_DELAY)
@@ -1,4 +1,5 @@
 from .command import CommandType
+from ..util import stats
 from ..util.config import Config
 
 
@@ -25,14 +26,14 @@ class Help(CommandType):
                         and (not cmd_type.admin_only or self.necrobot.is_admin(command.author)):
                     command_list_text += '`' + cmd_type.mention + '`, '
             command_list_text = command_list_text[:-2]
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 'Available commands in this channel: {0}\n\nType `{1} <command>` for more info about a particular '
                 'command.'.format(command_list_text, self.mention))
         elif len(command.args) == 1:
             for cmd_type in self.bot_channel.command_types:
                 if cmd_type.called_by(command.args[0]):
-                    await self.necrobot.client.send_message(
+                    await self.necrobot.outbound.send_message(
                         command.channel, '`{0}`: {1}'.format(cmd_type.mention, cmd_type.help_text))
             return None
 
@@ -43,7 +44,7 @@ class Info(CommandType):
         self.help_text = "Necrobot version information."
 
     async def _do_execute(self, cmd):
-        await self.bot_channel.client.send_message(
+        await self.necrobot.outbound.send_message(
             cmd.channel,
             'Necrobot v-{0} (alpha). Type `.help` for a list of commands.'.format(Config.BOT_VERSION))
 
@@ -64,19 +65,22 @@ class Register(CommandType):
         self.help_text = 'Register your current Discord name as the name to use for the bot.'
 
     async def _do_execute(self, cmd):
-        self.necrobot.register_user(cmd.author)
-        await self.necrobot.client.send_message(cmd.channel, 'Registered your name as {0}.'.format(cmd.author.mention))
+        await self.necrobot.register_user(cmd.author)
+        await self.necrobot.outbound.send_message(
+            cmd.channel, 'Registered your name as {0}.'.format(cmd.author.mention))
 
 
 class RegisterAll(CommandType):
     def __init__(self, bot_channel):
         CommandType.__init__(self, bot_channel, 'registerall')
-        self.help_text = 'Register all unregistered users. [Admin only]'
+        self.help_text = 'Register all unregistered users, and update changed names. [Admin only]'
         self.admin_only = True
 
     async def _do_execute(self, cmd):
-        self.necrobot.register_all_users()
-        await self.necrobot.client.send_message(cmd.channel, 'Registered all unregistered users.')
+        rows_written, seconds = await self.necrobot.register_all_users()
+        await self.necrobot.outbound.send_message(
+            cmd.channel,
+            'Registered all unregistered users ({0} written in {1:.2f} s).'.format(rows_written, seconds))
 
 
 class RedoInit(CommandType):
@@ -87,3 +91,15 @@ class RedoInit(CommandType):
 
     async def _do_execute(self, cmd):
         self.necrobot.post_login_init(self.necrobot.server.id)
+
+
+class Stats(CommandType):
+    def __init__(self, bot_channel):
+        CommandType.__init__(self, bot_channel, 'stats')
+        self.help_text = 'Show internal counters and timings. [Admin only]'
+        self.admin_only = True
+
+    async def _do_execute(self, cmd):
+        lines = stats.summary_lines()
+        text = '\n'.join(lines) if lines else 'Nothing recorded yet.'
+        await self.necrobot.outbound.send_message(cmd.channel, '```\n{0}\n```'.format(text[:1980]))
@@ -3,6 +3,7 @@ import discord
 import random
 
 from .command import CommandType
+from ..util.outbound import Priority
 
 PROTECTED_ROLENAMES = ['Necrobot']
 ROLES_COLORS = {
@@ -29,7 +30,7 @@ ROLES_COLORS = {
     }
 
 
-async def color_user(member, client, server):
+async def color_user(member, outbound, server):
     protected_colors = []
     for role in server.roles:
         if role.name in PROTECTED_ROLENAMES:
@@ -37,7 +38,7 @@ async def color_user(member, client, server):
 
     for role in member.roles:
         if role.name in ROLES_COLORS.keys():
-            await client.remove_roles(member, role)
+            await outbound.remove_roles(member, role)
             protected_colors.append(role.colour)
 
     new_colorname = get_random_colorname(protected_colors)
@@ -47,13 +48,13 @@ async def color_user(member, client, server):
             role_to_use = role
 
     if role_to_use is None:
-        role_to_use = await client.create_role(
+        role_to_use = await outbound.create_role(
             server,
             name=new_colorname,
             color=ROLES_COLORS[new_colorname],
             hoist=False)
 
-    await client.add_roles(member, role_to_use)
+    await outbound.add_roles(member, role_to_use)
 
 
 def get_random_colorname(protected_colors):
@@ -68,5 +69,5 @@ class ColorMe(CommandType):
         self.secret_command = True
 
     async def _do_execute(self, command):
-        asyncio.ensure_future(color_user(command.author, self.necrobot.client, self.necrobot.server))
-        asyncio.ensure_future(self.necrobot.client.delete_message(command.message))
+        asyncio.ensure_future(color_user(command.author, self.necrobot.outbound, self.necrobot.server))
+        asyncio.ensure_future(self.necrobot.outbound.delete_message(command.message, priority=Priority.alert))
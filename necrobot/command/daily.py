@@ -13,8 +13,8 @@ class DailyCommandType(CommandType):
         return self.necrobot.daily_manager
 
     @property
-    def client(self):
-        return self._daily_manager.necrobot.client
+    def outbound(self):
+        return self._daily_manager.necrobot.outbound
 
     async def _do_execute(self, command):
         today_number = self._daily_manager.today_number
@@ -23,7 +23,7 @@ class DailyCommandType(CommandType):
         if daily_type:
             await self._daily_do_execute(command, daily_type)
         else:
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: I couldn't figure out which daily you wanted to call a command for.".format(
                     command.author.mention))
@@ -39,7 +39,7 @@ class DailyChar(DailyCommandType):
 
     async def _daily_do_execute(self, command, daily_type):
         character = dailytype.character(dailytype.DailyType.rotating, self._daily_manager.today_number)
-        await self.client.send_message(
+        await self.outbound.send_message(
             command.channel,
             'Today\'s character is {0}.'.format(character))
 
@@ -54,25 +54,25 @@ class DailyResubmit(DailyCommandType):
     async def _daily_do_execute(self, command, daily_type):
         daily = self._daily_manager.daily(daily_type)
 
-        last_submitted = daily.submitted_daily(command.author.id)
+        last_submitted = await daily.submitted_daily(command.author.id)
         character = dailytype.character(daily_type, last_submitted)
 
         if last_submitted == 0:
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: You've never submitted for a daily of this type.".format(command.author.mention))
         elif not daily.is_open(last_submitted):
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: The {1} {2} daily has closed.".format(
                     command.author.mention,
                     daily.daily_to_shortstr(last_submitted),
                     character))
         else:
-            submission_string = daily.parse_submission(last_submitted, command.author, command.args)
+            submission_string = await daily.parse_submission(last_submitted, command.author, command.args)
             if submission_string:   # parse succeeded
                 await self._daily_manager.update_leaderboard(last_submitted, daily_type)
-                await self.client.send_message(
+                await self.outbound.send_message(
                     command.channel,
                     "Reubmitted for {0}, {2}: You {1}.".format(
                         daily.daily_to_shortstr(last_submitted),
@@ -80,7 +80,7 @@ class DailyResubmit(DailyCommandType):
                         character))
 
             else:                   # parse failed
-                await self.client.send_message(
+                await self.outbound.send_message(
                     command.channel,
                     "{0}: I had trouble parsing your submission. Please use one of the forms: `{1} 12:34.56` "
                     "or `{1} death 4-4`.".format(command.author.mention, self.mention))
@@ -94,7 +94,7 @@ class DailyRules(DailyCommandType):
     async def _daily_do_execute(self, command, daily_type):
         character = dailytype.character(daily_type, self._daily_manager.today_number)
         # noinspection PyUnresolvedReferences
-        await self.client.send_message(
+        await self.outbound.send_message(
             command.channel,
             "Rules for the {0} speedrun daily:\n"
             "\N{BULLET} {0} seeded all zones; get the seed for the daily using `.dailyseed`.\n"
@@ -125,7 +125,7 @@ class DailySchedule(DailyCommandType):
             else:
                 char_list_str += charname + ' -- '
         char_list_str = char_list_str[:-4]
-        await self.client.send_message(
+        await self.outbound.send_message(
             command.channel,
             'Upcoming characters, starting today: {0}.'.format(char_list_str))
 
@@ -145,14 +145,14 @@ class DailySeed(DailyCommandType):
 
         character = dailytype.character(daily_type, today)
 
-        if daily.has_submitted(today, user_id):
-            await self.client.send_message(
+        if await daily.has_submitted(today, user_id):
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: You have already submitted for today's {1} daily.".format(command.author.mention, character))
         else:
-            daily.register(today, user_id)
-            seed = daily.get_seed(today)
-            await self.client.send_message(
+            await daily.register(today, user_id)
+            seed = await daily.get_seed(today)
+            await self.outbound.send_message(
                 command.author,
                 "({0}) {2} speedrun seed: {1}. This is a single-attempt {2} seeded all zones run. (See `.dailyrules` "
                 "for complete rules.)".format(today_date.strftime("%d %b"), seed, character))
@@ -171,9 +171,9 @@ class DailyStatus(DailyCommandType):
             daily = self._daily_manager.daily(dtype)
             character = dailytype.character(dtype, today_number)
             old_char = dailytype.character(dtype, today_number - 1)
-            last_registered = daily.registered_daily(command.author.id)
+            last_registered = await daily.registered_daily(command.author.id)
             days_since_registering = today_number - last_registered
-            submitted = daily.has_submitted(last_registered, command.author.id)
+            submitted = await daily.has_submitted(last_registered, command.author.id)
 
             if days_since_registering == 1 and not submitted and daily.within_grace_period():
                 status += "You have not gotten today's {1} seed. You may still submit for yesterday's {2} daily, " \
@@ -188,7 +188,7 @@ class DailyStatus(DailyCommandType):
                 status += "You have not yet submitted to the {1} daily: Use `.dailysubmit` to submit a result. " \
                           "Today's {1} daily is open for another {0}. ".format(daily.daily_close_timestr(), character)
 
-        await self.client.send_message(command.channel, '{0}: {1}'.format(command.author.mention, status))
+        await self.outbound.send_message(command.channel, '{0}: {1}'.format(command.author.mention, status))
 
 
 class DailySubmit(DailyCommandType):
@@ -205,24 +205,24 @@ class DailySubmit(DailyCommandType):
         daily = self._daily_manager.daily(daily_type)
 
         # Command sent via PM or in #dailyspoilerchat
-        daily_number = daily.registered_daily(command.author.id)
+        daily_number = await daily.registered_daily(command.author.id)
         character = dailytype.character(daily_type, daily_number)
 
         if daily_number == 0:
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: Please get today's {1} daily seed before submitting (use `.dailyseed`).".format(
                     command.author.mention,
                     character))
         elif not daily.is_open(daily_number):
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: Too late to submit for the {1} {2} daily. Get today's seed with `.dailyseed`.".format(
                     command.author.mention,
                     daily.daily_to_shortstr(daily_number),
                     character))
-        elif daily.has_submitted(daily_number, command.author.id):
-            await self.client.send_message(
+        elif await daily.has_submitted(daily_number, command.author.id):
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: You have already submitted for the {1} {2} daily. "
                 "Use `.dailyresubmit` to edit your submission.".format(
@@ -230,10 +230,10 @@ class DailySubmit(DailyCommandType):
                     daily.daily_to_shortstr(daily_number),
                     character))
         else:
-            submission_string = daily.parse_submission(daily_number, command.author, command.args)
+            submission_string = await daily.parse_submission(daily_number, command.author, command.args)
             if submission_string:       # parse succeeded
                 await self._daily_manager.update_leaderboard(daily_number, daily_type)
-                await self.client.send_message(
+                await self.outbound.send_message(
                     command.channel,
                     "Submitted for {0}, {2}: You {1}.".format(
                         daily.daily_to_shortstr(daily_number),
@@ -241,7 +241,7 @@ class DailySubmit(DailyCommandType):
                         character))
 
             else:                       # parse failed
-                await self.client.send_message(
+                await self.outbound.send_message(
                     command.channel,
                     "{0}: I had trouble parsing your submission. "
                     "Please use one of the forms: `{1} 12:34.56` or `{1} death 4-4`.".format(
@@ -257,7 +257,7 @@ class DailyUnsubmit(DailyCommandType):
 
     async def _daily_do_execute(self, command, daily_type):
         daily = self._daily_manager.daily(daily_type)
-        daily_number = daily.submitted_daily(command.author.id)
+        daily_number = await daily.submitted_daily(command.author.id)
         character = dailytype.character(daily_type, daily_number)
 
         if daily_number == 0:
@@ -268,12 +268,12 @@ class DailyUnsubmit(DailyCommandType):
             else:
                 daily_string = '<error>'
 
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: You've never submitted for {1} daily.".format(command.author.mention, daily_string))
 
         elif not daily.is_open(daily_number):
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "{0}: The {1} {2} daily has closed.".format(
                     command.author.mention,
@@ -281,8 +281,8 @@ class DailyUnsubmit(DailyCommandType):
                     character))
 
         else:
-            daily.delete_from_daily(daily_number, command.author)
-            await self.client.send_message(
+            await daily.delete_from_daily(daily_number, command.author)
+            await self.outbound.send_message(
                 command.channel,
                 "Deleted your daily submission for {0}, {1}.".format(
                     daily.daily_to_shortstr(daily_number),
@@ -305,18 +305,18 @@ class DailyWhen(DailyCommandType):
             if charname in dailytype.rotating_daily_chars:
                 days_until = dailytype.days_until(charname, today_number)
                 if days_until == 0:
-                    await self.client.send_message(
+                    await self.outbound.send_message(
                         command.channel,
                         'The {0} daily is today!'.format(charname))
                     return
                 elif days_until == 1:
-                    await self.client.send_message(
+                    await self.outbound.send_message(
                         command.channel,
                         'The {0} daily is tomorrow!'.format(charname))
                     return
                 elif days_until is not None:
                     date = datetime.datetime.utcnow().date() + datetime.timedelta(days=days_until)
-                    await self.client.send_message(
+                    await self.outbound.send_message(
                         command.channel,
                         'The {0} daily is in {1} days ({2}, {3}).'.format(
                             charname,
@@ -325,7 +325,7 @@ class DailyWhen(DailyCommandType):
                     return
 
         if daily_type == dailytype.DailyType.rotating:
-            await self.client.send_message(
+            await self.outbound.send_message(
                 command.channel,
                 "Today's rotating character is {0}.".format(dailytype.character(daily_type, today_number)))
 
@@ -10,7 +10,7 @@ class DailyAlert(CommandType):
 
     async def _do_execute(self, command):
         if len(command.args) != 1 or command.args[0].lower() not in ['on', 'off']:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 "Couldn't parse command. Call `{0} on` or `{0} off`.".format(self.mention))
             return
@@ -21,14 +21,14 @@ class DailyAlert(CommandType):
         else:
             user_prefs.daily_alert = False
 
-        self.necrobot.prefs_manager.set_prefs(user_prefs, command.author)
+        await self.necrobot.prefs_manager.set_prefs(user_prefs, command.author)
 
         if user_prefs.daily_alert:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 "{0}: You will now receive PM alerts with the new daily seeds.".format(command.author.mention))
         else:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 "{0}: You will no longer receive PM alerts for dailies.".format(command.author.mention))
 
@@ -41,7 +41,7 @@ class RaceAlert(CommandType):
 
     async def _do_execute(self, command):
         if len(command.args) != 1 or command.args[0].lower() not in ['on', 'off']:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 "Couldn't parse command. Call `{0} on` or `{0} off`.".format(self.mention))
             return
@@ -52,14 +52,14 @@ class RaceAlert(CommandType):
         else:
             user_prefs.race_alert = False
 
-        self.necrobot.prefs_manager.set_prefs(user_prefs, command.author)
+        await self.necrobot.prefs_manager.set_prefs(user_prefs, command.author)
 
         if user_prefs.race_alert:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 "{0}: You will now receive PM alerts when a new raceroom is made.".format(command.author.mention))
         else:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel,
                 "{0}: You will no longer receive PM alerts for races.".format(command.author.mention))
 
@@ -70,10 +70,10 @@ class ViewPrefs(CommandType):
         self.help_text = "See your current user preferences."
 
     async def _do_execute(self, command):
-        prefs = self.necrobot.prefs_manager.get_prefs(command.author)
+        prefs = await self.necrobot.prefs_manager.get_prefs(command.author)
         prefs_string = ''
         for pref_str in prefs.pref_strings:
             prefs_string += ' ' + pref_str
-        await self.necrobot.client.send_message(
+        await self.necrobot.outbound.send_message(
             command.author,
             'Your current user preferences: {}'.format(prefs_string))
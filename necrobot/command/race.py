@@ -50,7 +50,7 @@ class Done(CommandType):
                          'You may instead use `.finish` if preferred.'
 
     async def _do_execute(self, command):
-        await self.bot_channel.current_race.finish_member(command.author)
+        await self.bot_channel.current_race.finish_member(command.author, command.message.timestamp)
 
 
 class Undone(CommandType):
@@ -68,7 +68,7 @@ class Forfeit(CommandType):
         self.help_text = 'Forfeits from the race. You may use `.quit` instead of `.forfeit` if preferred.'
 
     async def _do_execute(self, command):
-        await self.bot_channel.current_race.forfeit_member(command.author)
+        await self.bot_channel.current_race.forfeit_member(command.author, command.message.timestamp)
 
 
 class Unforfeit(CommandType):
@@ -193,14 +193,9 @@ class Missing(CommandType):
             unentered_usernames = ''
             unready_usernames = ''
             for user in self.bot_channel.mentioned_users:
-                user_entered = False
-                for racer in self.bot_channel.current_race.racers:
-                    if int(racer.member.id) == int(user.id):
-                        user_entered = True
-                        break
-                if not user_entered:
+                if not self.bot_channel.current_race.has_racer(user):
                     unentered_usernames += user.display_name + ', '
-            for racer in self.bot_channel.current_race.racers:
+            for racer in self.bot_channel.current_race.racers.values():
                 if not racer.is_ready:
                     unready_usernames += racer.member.display_name + ', '
 
@@ -211,7 +206,7 @@ class Missing(CommandType):
                 'Unentered: {0}. \nUnready: {1}.'.format(unentered_usernames, unready_usernames))
         elif self.bot_channel.current_race.during_race:
             racing_usernames = ''
-            for racer in self.bot_channel.current_race.racers:
+            for racer in self.bot_channel.current_race.racers.values():
                 if racer.is_racing:
                     racing_usernames += racer.member.display_name + ', '
             racing_usernames = racing_usernames[:-2] if racing_usernames else 'Nobody!'
@@ -272,7 +267,7 @@ class ForceForfeit(CommandType):
             return
 
         for name in command.args:
-            for racer in self.bot_channel.last_begun_race.racers:
+            for racer in self.bot_channel.last_begun_race.racers.values():
                 if racer.name.lower() == name.lower():
                     await self.bot_channel.last_begun_race.forfeit_racer(racer)
 
@@ -318,7 +313,7 @@ class Pause(CommandType):
         self.admin_only = True
 
     async def _do_execute(self, command):
-        success = await self.bot_channel.pause()
+        success = await self.bot_channel.pause(command.message.timestamp)
         if success:
             await self.bot_channel.write('Race paused by {}!'.format(command.author.mention))
 
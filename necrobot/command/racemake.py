@@ -34,7 +34,7 @@ class Make(CommandType):
             try:
                 await self.necrobot.race_manager.make_room(race_info)
             except discord.HTTPException as e:
-                await self.necrobot.client.send_message(command.channel, 'Error making race.')
+                await self.necrobot.outbound.send_message(command.channel, 'Error making race.')
                 logging.getLogger('discord').warning(e.response)
 
 
@@ -59,7 +59,7 @@ class MakePrivate(CommandType):
             for _ in range(repeat_index):
                 await self.necrobot.race_manager.make_private_room(private_race_info, command.author)
         else:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel, 'Error parsing arguments to `.makeprivate`.')
 
 
@@ -88,5 +88,5 @@ class MakeCondor(CommandType):
             for _ in range(repeat_index):
                 await self.necrobot.race_manager.make_private_room(private_race_info, command.author)
         else:
-            await self.necrobot.client.send_message(
+            await self.necrobot.outbound.send_message(
                 command.channel, 'Error parsing arguments to `.makecondor`.')
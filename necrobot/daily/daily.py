@@ -3,10 +3,11 @@ import asyncio
 import datetime
 
 from . import dailytype
+from .dailyleaderboard import DailyLeaderboard
 from ..race import racetime
 from ..util import level, seedgen
 from ..util.config import Config
-from ..necrodb import NecroDB
+from ..necrodb import AsyncNecroDB, user_name
 
 DATE_ZERO = datetime.date(2016, 1, 1)
 
@@ -34,6 +35,10 @@ class Daily(object):
     def __init__(self, daily_manager, daily_type):
         self._daily_manager = daily_manager
         self._daily_type = daily_type
+        self._leaderboards = {}                 # maps daily numbers onto DailyLeaderboards
+        self._seeds = {}                        # maps daily numbers onto their seeds
+        # Held while reading or changing submissions, so that _leaderboards stays consistent with the database
+        self._leaderboard_lock = asyncio.Lock()
         self._daily_update_future = asyncio.ensure_future(self._daily_update())
 
     def close(self):
@@ -110,97 +115,100 @@ class Daily(object):
             dailytype.leaderboard_header(self.daily_type, daily_number),
             self.daily_to_datestr(daily_number))
 
-    # Return the text for the daily with the given daily number
-    def leaderboard_text(self, daily_number, display_seed=False):
-        text = "``` \n"
-        text += self.leaderboard_header(daily_number) + '\n'
-
-        params = (daily_number, self.daily_type.value)
-
+    # Return the text for the daily with the given daily number, as a list of pages (one per leaderboard message), each
+    # with at most Config.DAILY_LEADERBOARD_PAGE_SIZE entries
+    async def leaderboard_pages(self, daily_number, display_seed=False):
+        header = self.leaderboard_header(daily_number)
+        first_header = header
         if display_seed:
-            for row in NecroDB().get_daily_seed(params):
-                text += "Seed: {}\n".format(row[0])
-                break
-
-        no_entries = True
-        rank = int(0)
-
-        prior_result = ''   # detect and handle ties
-        rank_to_display = int(1)
-
-        for row in NecroDB().get_daily_times(params):
-            name = row[0]
-            lv = row[1]
-            time = row[2]
-            if lv == 18:
-                result_string = racetime.to_str(time)
-            elif lv == -1:
-                continue
-            else:
-                result_string = level.to_str(lv)
-                if result_string == '':
-                    result_string = "death"
-                else:
-                    result_string = "death ({0})".format(result_string)
-
-            rank += 1
-            no_entries = False
-
-            # update the rank only if we've gotten a different result than the last entrant
-            if result_string != prior_result:   # kinda hacky to use a string comparison here, but works
-                rank_to_display = rank
-
-            prior_result = result_string
-
-            text += '{0: >3}. {1: <24} {2}\n'.format(rank_to_display, name, result_string)
-
-        if no_entries:
-            text += 'No entries yet.\n'
-
-        text += '```'
-        return text
+            seed = await self._stored_seed(daily_number)
+            if seed is not None:
+                first_header += "\nSeed: {}".format(seed)
+
+        async with self._leaderboard_lock:
+            leaderboard = await self._get_leaderboard(daily_number)
+
+        pages = []
+        for page_number, page in enumerate(leaderboard.pages()):
+            page_header = first_header if page_number == 0 else '{0} (continued)'.format(header)
+            pages.append("``` \n{0}\n{1}```".format(page_header, page))
+        return pages
+
+    # Returns the DailyLeaderboard for the given daily number, reading it from the database if it isn't in memory.
+    # Call with _leaderboard_lock held.
+    async def _get_leaderboard(self, daily_number):
+        if daily_number not in self._leaderboards:
+            params = (daily_number, self.daily_type.value)
+            rows = await AsyncNecroDB().get_daily_times(params)
+
+            # Forget leaderboards for dailies that have closed; they'll be read again if they're ever needed
+            oldest_open = self.today_number - 1
+            for number in [number for number in self._leaderboards if number < oldest_open]:
+                del self._leaderboards[number]
+            self._leaderboards[daily_number] = DailyLeaderboard(rows, Config.DAILY_LEADERBOARD_PAGE_SIZE)
+        return self._leaderboards[daily_number]
+
+    # Record the given result in the in-memory leaderboard for the daily, if it's there. Call with _leaderboard_lock
+    # held, after the database has been updated. The name must be the one in user_data, which is what the leaderboard
+    # is built from when it's read from the database; Necrobot keeps user_data's names current as members join and
+    # change names, so user_name() of the user's server member gives it.
+    def _update_leaderboard(self, daily_number, user_id, name, lv, time):
+        if daily_number in self._leaderboards:
+            self._leaderboards[daily_number].set_result(user_id, name, lv, time)
+
+    # Returns the given user as a server member if they are one (submissions usually come by PM, where the author is
+    # a plain User without the server nickname that user_data stores)
+    def _as_member(self, user):
+        member = self.necrobot.get_as_member(user)
+        return member if member is not None else user
 
     # True if the given user has submitted for the given daily
-    def has_submitted(self, daily_number, user_id):
+    async def has_submitted(self, daily_number, user_id):
         params = (user_id, daily_number, self.daily_type.value)
-        return NecroDB().has_submitted_daily(params)
+        return await AsyncNecroDB().has_submitted_daily(params)
 
     # True if the given user has registered for the given daily
     # DB_acc
-    def has_registered(self, daily_number, user_id):
+    async def has_registered(self, daily_number, user_id):
         params = (user_id, daily_number, self.daily_type.value)
-        return NecroDB().has_registered_daily(params)
+        return await AsyncNecroDB().has_registered_daily(params)
 
     # Attempts to register the given user for the given daily
     # DB_acc
-    def register(self, daily_number, user_id):
-        if self.has_registered(daily_number, user_id):
+    async def register(self, daily_number, user_id):
+        if await self.has_registered(daily_number, user_id):
             return False
         else:
             params = (user_id, daily_number, self.daily_type.value, -1, -1)
-            NecroDB().register_daily(params)
+            await AsyncNecroDB().register_daily(params)
             return True
 
+    # Registers all the given users for the given daily at once (users already registered, or who have submitted, are
+    # left alone). Returns the number of users newly registered.
+    async def register_all(self, daily_number, user_ids):
+        rows_written, _ = await AsyncNecroDB().register_all_daily(user_ids, daily_number, self.daily_type.value)
+        return rows_written
+
     # Returns the most recent daily for which the user is registered (or 0 if no such)
     # DB_acc
-    def registered_daily(self, user_id):
+    async def registered_daily(self, user_id):
         params = (user_id, self.daily_type.value)
-        for row in NecroDB().registered_daily(params):
+        for row in await AsyncNecroDB().registered_daily(params):
             return row[0]
         return 0
 
     # Returns the most recent daily for which the user has submitted (or 0 if no such)
     # DB_acc
-    def submitted_daily(self, user_id):
+    async def submitted_daily(self, user_id):
         params = (user_id, self.daily_type.value,)
-        for row in NecroDB().submitted_daily(params):
+        for row in await AsyncNecroDB().submitted_daily(params):
             if row[1] != -1:
                 return row[0]
         return 0
 
     # Attempt to parse args as a valid daily submission, and submits for the daily if sucessful.
     # Returns a string whose content confirms parse, or the empty string if parse fails.
-    def parse_submission(self, daily_number, user, args):
+    async def parse_submission(self, daily_number, user, args):
         lv = -1
         time = -1
         ret_str = ''
@@ -220,62 +228,75 @@ class Daily(object):
                     ret_str = 'finished in {}'.format(racetime.to_str(time))
 
         if not lv == -1:    # parse succeeded
-            self.submit_to_daily(daily_number, user, lv, time)
+            await self.submit_to_daily(daily_number, user, lv, time)
             return ret_str
         else:
             return ''
 
     # Submit a run to the given daily number
-    def submit_to_daily(self, daily_number, user, lv, time):
+    async def submit_to_daily(self, daily_number, user, lv, time):
         params = (user.id, daily_number, self.daily_type.value, lv, time,)
-        NecroDB().register_daily(params)
+        member = self._as_member(user)
+        async with self._leaderboard_lock:
+            await AsyncNecroDB().register_daily(params)
+            self._update_leaderboard(daily_number, user.id, user_name(member), lv, time)
 
     # Delete a run from the daily
-    def delete_from_daily(self, daily_number, user):
+    async def delete_from_daily(self, daily_number, user):
         params = (-1, user.id, daily_number, self.daily_type.value)
-        NecroDB().delete_from_daily(params)
+        async with self._leaderboard_lock:
+            await AsyncNecroDB().delete_from_daily(params)
+            self._update_leaderboard(daily_number, user.id, None, -1, -1)
 
     # Return the seed for the given daily number. Create seed if it doesn't already exist.
-    def get_seed(self, daily_number):
-        params = (daily_number, self.daily_type.value)
-
-        for row in NecroDB().get_daily_seed(params):
-            return row[0]
+    async def get_seed(self, daily_number):
+        seed = await self._stored_seed(daily_number)
+        if seed is not None:
+            return seed
 
         # if we made it here, there was no entry in the table, so make one
         today_seed = seedgen.get_new_seed()
-        values = (daily_number, self.daily_type.value, today_seed, 0,)
-        NecroDB().create_daily(values)
+        values = (daily_number, self.daily_type.value, today_seed,)
+        await AsyncNecroDB().create_daily(values)
+        self._seeds[daily_number] = today_seed
         return today_seed
 
-    # Registers the given Message ID in the database for the given daily number
-    def register_message(self, daily_number, message_id):
-        params = (daily_number, self.daily_type.value)
-        for _ in NecroDB().get_daily_seed(params):
-            # if here, there was an entry in the table, so we will update it
-            values = (message_id, daily_number, self.daily_type.value)
-            NecroDB().update_daily(values)
-            return
-
-        # else, there was no entry, so make one
-        today_seed = seedgen.get_new_seed()
-        values = (daily_number, self.daily_type.value, today_seed, message_id,)
-        NecroDB().create_daily(values)
-
-    # Returns the Discord Message ID for the leaderboard entry for the given daily number
-    def get_message_id(self, daily_number):
+    # Returns the seed stored for the given daily number, or None if there isn't one yet
+    async def _stored_seed(self, daily_number):
+        if daily_number not in self._seeds:
+            params = (daily_number, self.daily_type.value)
+            for row in await AsyncNecroDB().get_daily_seed(params):
+                self._seeds[daily_number] = row[0]
+                break
+            else:
+                return None
+        return self._seeds[daily_number]
+
+    # Registers the given Message ID in the database as the given page of the leaderboard for the given daily number
+    # (making the daily, if it doesn't exist yet)
+    async def register_message(self, daily_number, page, message_id):
+        await self.get_seed(daily_number)
+        values = (daily_number, self.daily_type.value, page, message_id)
+        await AsyncNecroDB().set_daily_leaderboard_msg(values)
+
+    # Forgets the leaderboard messages for the given daily number from the given page on
+    async def unregister_messages(self, daily_number, first_page):
+        params = (daily_number, self.daily_type.value, first_page)
+        await AsyncNecroDB().delete_daily_leaderboard_msgs(params)
+
+    # Returns a dict mapping page numbers onto the Discord Message IDs of the leaderboard messages for the given daily
+    # number
+    async def get_message_ids(self, daily_number):
         params = (daily_number, self.daily_type.value)
-        for row in NecroDB().get_daily_message_id(params):
-            return int(row[0])
-        return None
+        return {int(row[0]): int(row[1]) for row in await AsyncNecroDB().get_daily_leaderboard_msgs(params)}
 
     # Return a DailyUserStatus corresponding to the status of the current daily for the given user
-    def user_status(self, user_id, daily_number):
+    async def user_status(self, user_id, daily_number):
         if not self.is_open(daily_number):
             return DailyUserStatus.closed
-        elif self.has_submitted(daily_number, user_id):
+        elif await self.has_submitted(daily_number, user_id):
             return DailyUserStatus.submitted
-        elif self.has_registered(daily_number, user_id):
+        elif await self.has_registered(daily_number, user_id):
             return DailyUserStatus.registered
         else:
             return DailyUserStatus.unregistered
@@ -0,0 +1,68 @@
+# The submissions to one daily, kept sorted in memory so that a submission doesn't mean re-reading and re-sorting the
+# whole leaderboard. The rendered pages are cached until the next change.
+
+import bisect
+
+from ..race import racetime
+from ..util import level
+
+
+class DailyLeaderboard(object):
+    # rows: [list<(discord_id, name, level, time)>] the daily's rows from the database, in any order
+    # page_size: [int] the number of entries on each page
+    def __init__(self, rows, page_size):
+        self._keys = {}                     # maps discord ids (as ints) onto their entry's sort key in _sorted
+        self._sorted = []                   # sort keys (-level, time, name, discord_id), best result first
+        self._page_size = page_size
+        self._pages = None                  # cached result of pages(); None if out of date
+        for discord_id, name, lv, time in rows:
+            self.set_result(discord_id, name, lv, time)
+
+    # Record the given user's result, replacing any result they had before. A level of -1 means no submission (the
+    # user is only registered, or has unsubmitted), and removes them from the leaderboard.
+    def set_result(self, discord_id, name, lv, time):
+        discord_id = int(discord_id)
+        old_key = self._keys.pop(discord_id, None)
+        if old_key is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, old_key)]
+
+        if lv != -1:
+            new_key = (-lv, time, name, discord_id)
+            bisect.insort(self._sorted, new_key)
+            self._keys[discord_id] = new_key
+        self._pages = None
+
+    # Returns the ranked lines of the leaderboard (without header), as a list of strings of at most page_size lines
+    # each. There is always at least one page.
+    def pages(self):
+        if self._pages is None:
+            lines = self._render()
+            if lines:
+                self._pages = [''.join(lines[i:i + self._page_size]) for i in range(0, len(lines), self._page_size)]
+            else:
+                self._pages = ['No entries yet.\n']
+        return self._pages
+
+    def _render(self):
+        lines = []
+        prior_result = ''   # detect and handle ties
+        rank_to_display = int(1)
+        for rank, (neg_lv, time, name, _) in enumerate(self._sorted, start=1):
+            lv = -neg_lv
+            if lv == 18:
+                result_string = racetime.to_str(time)
+            else:
+                result_string = level.to_str(lv)
+                if result_string == '':
+                    result_string = "death"
+                else:
+                    result_string = "death ({0})".format(result_string)
+
+            # update the rank only if we've gotten a different result than the last entrant
+            if result_string != prior_result:   # kinda hacky to use a string comparison here, but works
+                rank_to_display = rank
+
+            prior_result = result_string
+
+            lines.append('{0: >3}. {1: <24} {2}\n'.format(rank_to_display, name, result_string))
+        return lines
@@ -1,11 +1,16 @@
+import asyncio
 import datetime
+import discord
 import logging
 from . import dailytype
 from .dailytype import DailyType
 from .daily import DATE_ZERO
 from .daily import Daily
 from ..prefs.userprefs import UserPrefs
+from ..util import stats
 from ..util.config import Config
+from ..util.fanout import FanOut
+from ..util.outbound import Priority
 
 
 class DailyManager(object):
@@ -15,6 +20,9 @@ class DailyManager(object):
         self._leaderboard_channel = self.necrobot.find_channel(Config.DAILY_LEADERBOARDS_CHANNEL_NAME)
         self._cadence_daily = Daily(self, DailyType.cadence)
         self._rotating_daily = Daily(self, DailyType.rotating)
+        self._leaderboard_messages = {}     # maps (daily number, DailyType) onto dicts mapping page numbers onto the
+                                            # leaderboard discord.Messages
+        self._leaderboard_lock = asyncio.Lock()     # held while updating leaderboard messages
 
     def refresh(self):
         pass
@@ -44,38 +52,81 @@ class DailyManager(object):
             return self._rotating_daily
 
     # Do whatever UI things need to be done when a new daily happens
+    # Each stage is timed in stats as daily.rollover.<stage>.
     async def on_new_daily(self, daily):
-        # Make the leaderboard message
-        text = daily.leaderboard_text(self.today_number, display_seed=False)
-        msg = await self.client.send_message(self._leaderboard_channel, text)
-        daily.register_message(self.today_number, msg.id)
-
-        # Update yesterday's leaderboard with the seed
-        await self.update_leaderboard(self.today_number - 1, daily.daily_type, display_seed=True)
-
-        # PM users with the daily_alert preference
-        auto_pref = UserPrefs()
-        auto_pref.daily_alert = True
-        for member in self.necrobot.prefs_manager.get_all_matching(auto_pref):
-            daily.register(self.today_number, member.id)
-            await self.client.send_message(
-                member,
-                "({0}) Today's {2} speedrun seed: {1}".format(
+        daily_number = self.today_number
+        with stats.timed('daily.rollover') as rollover_timer:
+            # Get (or make) the seed, once for everyone
+            with stats.timed('daily.rollover.seed'):
+                seed = await daily.get_seed(daily_number)
+
+            # Make the leaderboard message, and update yesterday's leaderboard with the seed
+            with stats.timed('daily.rollover.leaderboard'):
+                await self.update_leaderboard(daily_number, daily.daily_type, display_seed=False)
+                await self.update_leaderboard(daily_number - 1, daily.daily_type, display_seed=True)
+
+            # Register users with the daily_alert preference, all in one go
+            with stats.timed('daily.rollover.register'):
+                auto_pref = UserPrefs()
+                auto_pref.daily_alert = True
+                members = await self.necrobot.prefs_manager.get_all_matching(auto_pref)
+                await daily.register_all(daily_number, [member.id for member in members])
+
+            # PM them the seed
+            with stats.timed('daily.rollover.alerts'):
+                alert_text = "({0}) Today's {2} speedrun seed: {1}".format(
                     self.today_date.strftime("%d %b"),
-                    daily.get_seed(self.today_number),
-                    dailytype.character(daily.daily_type, self.today_number)))
+                    seed,
+                    dailytype.character(daily.daily_type, daily_number))
+                await FanOut(self.necrobot.outbound, 'daily_alert').send_to_all(members, alert_text)
+
+        logging.getLogger('discord').info('Rolled over {0} daily for {1} subscribers in {2:.2f} s.'.format(
+            daily.daily_type.name, len(members), rollover_timer.elapsed))
 
-    # Update an existing leaderboard message for the given daily number
+    # Update the leaderboard messages for the given daily number, posting any that don't exist yet. Only pages whose
+    # text has changed are edited.
     async def update_leaderboard(self, daily_number, daily_type, display_seed=False):
         daily = self.daily(daily_type)
-        msg_id = daily.get_message_id(daily_number)
-
-        # If no message, make one
-        if not msg_id:
-            text = daily.leaderboard_text(daily_number, display_seed)
-            msg = await self.client.send_message(self._leaderboard_channel, text)
-            daily.register_message(daily_number, msg.id)
-        else:
-            async for msg in self.client.logs_from(self._leaderboard_channel, limit=10):
-                if int(msg.id) == msg_id:
-                    await self.client.edit_message(msg, daily.leaderboard_text(daily_number, display_seed))
+        async with self._leaderboard_lock:
+            pages = await daily.leaderboard_pages(daily_number, display_seed)
+            messages = await self._get_leaderboard_messages(daily, daily_number)
+
+            for page, text in enumerate(pages):
+                msg = messages.get(page)
+                if msg is None:
+                    msg = await self.necrobot.outbound.send_message(
+                        self._leaderboard_channel, text, priority=Priority.leaderboard)
+                    await daily.register_message(daily_number, page, msg.id)
+                elif msg.content != text:
+                    msg = await self.necrobot.outbound.edit_message(msg, text)
+                messages[page] = msg
+
+            # Remove pages that are no longer needed (e.g. after an unsubmit)
+            extra_pages = [page for page in messages if page >= len(pages)]
+            if extra_pages:
+                for page in extra_pages:
+                    try:
+                        await self.necrobot.outbound.delete_message(messages.pop(page))
+                    except discord.HTTPException:
+                        pass
+                await daily.unregister_messages(daily_number, len(pages))
+
+    # Returns a dict mapping page numbers onto the leaderboard discord.Messages for the given daily number. Uses the
+    # cache if possible; otherwise fetches the messages by the ids stored in the database. Messages that no longer
+    # exist are left out.
+    async def _get_leaderboard_messages(self, daily, daily_number):
+        key = (daily_number, daily.daily_type)
+        if key not in self._leaderboard_messages:
+            messages = {}
+            for page, msg_id in (await daily.get_message_ids(daily_number)).items():
+                try:
+                    messages[page] = await self.client.get_message(self._leaderboard_channel, str(msg_id))
+                except discord.NotFound:
+                    pass
+
+            # Drop cached messages for dailies that are no longer open (they'll be fetched again if ever needed)
+            oldest_open = self.today_number - 1
+            for old_key in [old_key for old_key in self._leaderboard_messages if old_key[0] < oldest_open]:
+                del self._leaderboard_messages[old_key]
+            self._leaderboard_messages[key] = messages
+        return self._leaderboard_messages[key]
@@ -1,11 +1,14 @@
+import asyncio
+
 from .channel.mainchannel import MainBotChannel
 from .channel.pmbotchannel import PMBotChannel
 from .daily.dailymanager import DailyManager
-from .necrodb import NecroDB
+from .necrodb import AsyncNecroDB, user_name
 from .prefs.prefsmanager import PrefsManager
 from .race.racemanager import RaceManager
-from .util import console
+from .util import console, stats
 from .util.config import Config
+from .util.outbound import OutboundScheduler
 
 
 class Necrobot(object):
@@ -14,11 +17,18 @@ class Necrobot(object):
     # logger: [logging.Logger]
     def __init__(self, client):
         self.client = client                    # the discord.Client object
+        self.outbound = OutboundScheduler(client)   # rate-limited queue for everything sent to discord
         self.server = None                      # the discord.Server on which to read commands
 
         self._main_discord_channel = None       # discord.Channel
 
         self._bot_channels = {}                 # maps discord.Channels onto BotChannels
+        self._members_by_id = {}                # maps discord ids (as ints) onto discord.Members of the server
+        self._members_by_name = {}              # maps lowercase display names onto lists of discord.Members
+        self._channels_by_id = {}               # maps channel ids (as ints) onto discord.Channels of the server
+        self._channels_by_name = {}             # maps channel names onto lists of discord.Channels
+        self._admin_role_ids = None             # set of ids of the server's admin roles; None if not yet computed
+        self._admin_status = {}                 # maps member ids (as ints) onto whether that member is an admin
         self._pm_bot_channel = None
 
         self._daily_manager = None
@@ -57,6 +67,9 @@ class Necrobot(object):
         console.info('-------------------------')
         console.info(' ')
 
+        self._build_indexes()
+        self._invalidate_admin_cache()
+
         self._main_discord_channel = self.find_channel(Config.MAIN_CHANNEL_NAME)
         if self._main_discord_channel is None:
             console.error('Could not find the "{0}" channel.'.format(Config.MAIN_CHANNEL_NAME))
@@ -70,6 +83,7 @@ class Necrobot(object):
             self._race_manager = RaceManager(self)
             self._prefs_manager = PrefsManager(self)
             self._initted = True
+            asyncio.ensure_future(self._sync_users())
         else:
             self.refresh()
 
@@ -96,6 +110,10 @@ class Necrobot(object):
             self._race_manager.close()
         if self._prefs_manager is not None:
             self._prefs_manager.close()
+        for bot_channel in self._bot_channels.values():
+            bot_channel.stop_command_queue()
+        if self._pm_bot_channel is not None:
+            self._pm_bot_channel.stop_command_queue()
         self._bot_channels.clear()
 
     # Returns the BotChannel corresponding to the given discord.Channel, if one exists
@@ -113,6 +131,7 @@ class Necrobot(object):
         self._bot_channels[discord_channel] = bot_channel
 
     def unregister_bot_channel(self, discord_channel):
+        self._bot_channels[discord_channel].stop_command_queue()
         del self._bot_channels[discord_channel]
 
     # True if the bot wants to quit (i.e. if logout() has been called)
@@ -130,12 +149,8 @@ class Necrobot(object):
     # return: [list<discord.Role>]
     @property
     def admin_roles(self):
-        admin_roles = []
-        for rolename in Config.ADMIN_ROLE_NAMES:
-            for role in self.server.roles:
-                if role.name == rolename:
-                    admin_roles.append(role)
-        return admin_roles
+        admin_role_ids = self._get_admin_role_ids()
+        return [role for role in self.server.roles if role.id in admin_role_ids]
 
     @property
     def race_manager(self):
@@ -153,58 +168,68 @@ class Necrobot(object):
     # user: [discord.User]
     # return: [bool]
     def is_admin(self, user):
-        member = self.get_as_member(user)
-        admin_roles = self.admin_roles
-        for role in member.roles:
-            if role in admin_roles:
-                return True
-        return False
+        user_id = int(user.id)
+        if user_id not in self._admin_status:
+            member = self.get_as_member(user)
+            if member is None:
+                return False
+            admin_role_ids = self._get_admin_role_ids()
+            self._admin_status[user_id] = any(role.id in admin_role_ids for role in member.roles)
+        return self._admin_status[user_id]
 
     # Returns the channel with the given name on the server, if any
     # channel_name: [string]
     # return: [discord.Channel]
     def find_channel(self, channel_name):
-        for channel in self.server.channels:
-            if channel.name == channel_name:
-                return channel
-        return None
+        channels = self._channels_by_name.get(channel_name)
+        return channels[0] if channels else None
 
     # Returns the channel with the given name on the server, if any
     # channel_name: [int]
     # return: [discord.Channel]
     def find_channel_with_id(self, channel_id):
-        for channel in self.server.channels:
-            if int(channel.id) == int(channel_id):
-                return channel
-        return None
+        return self._channels_by_id.get(int(channel_id))
 
     # Returns a list of all members with a given username (capitalization ignored)
     # username: [string]
     # return: [list<discord.Member>]
     def find_members(self, username):
-        to_return = []
-        for member in self.server.members:
-            if member.display_name.lower() == username.lower():
-                to_return.append(member)
-        return to_return
+        return list(self._members_by_name.get(username.lower(), []))
+
+    # Returns the member of the server with the given discord id, or None if there's no such member
+    # user_id: [int]
+    # return: [discord.Member]
+    def get_member_by_id(self, user_id):
+        return self._members_by_id.get(int(user_id))
+
+    # Cheap check on an incoming discord.Message, made before building a Command from it: returns False for messages
+    # that can't be commands for us (no command prefix, sent by the bot itself, or in a channel we don't read)
+    # message: [discord.Message]
+    # return: [bool]
+    def accepts_message(self, message):
+        stats.increment('messages.seen')
+        if not message.content.startswith(Config.BOT_COMMAND_PREFIX):
+            return False
+        if message.author.id == self.client.user.id:
+            return False
+        return message.channel.is_private or message.channel in self._bot_channels
 
     # Returns the given Discord user as a member of the server
     # user: [discord.User]
     # return: [discord.Member]
     def get_as_member(self, user):
-        for member in self.server.members:
-            if int(member.id) == int(user.id):
-                return member
+        return self._members_by_id.get(int(user.id))
 
-    # Registers all users currently on the server
-    def register_all_users(self):
-        NecroDB().register_all_users(self.server.members)
+    # Registers all users currently on the server, writing only those whose name or id isn't in the database yet.
+    # Returns a pair (number of rows written, seconds taken).
+    async def register_all_users(self):
+        return await AsyncNecroDB().register_all_users(list(self.server.members), True)
 
     # Registers a specific user on the server
     # member: [discord.Member]
     @staticmethod
-    def register_user(member):
-        NecroDB().register_all_users([member])
+    async def register_user(member):
+        await AsyncNecroDB().register_all_users([member])
 
 # Coroutines--------------------
     # Log out of discord
@@ -216,9 +241,58 @@ class Necrobot(object):
     async def reboot(self):
         await self.client.logout()
 
+    # Bring the user table up to date with the server's member list. Runs in the background, so errors are logged here.
+    async def _sync_users(self):
+        try:
+            rows_written, seconds = await self.register_all_users()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            console.error('Failed to sync users: {0}'.format(e))
+        else:
+            console.info('Synced users: wrote {0} rows in {1:.3f} s.'.format(rows_written, seconds))
+
     # Call this when anyone joins the server
     async def on_member_join(self, member):
-        self.register_user(member)
+        if self._on_our_server(member):
+            self._index_member(member)
+        await self.register_user(member)
+
+    # Call this when anyone leaves the server
+    async def on_member_remove(self, member):
+        if self._on_our_server(member):
+            self._unindex_member(member)
+            self._admin_status.pop(int(member.id), None)
+
+    # Call this when a member's details (name, roles, etc.) change
+    async def on_member_update(self, before, after):
+        if self._on_our_server(after):
+            self._unindex_member(before)
+            self._index_member(after)
+            self._admin_status.pop(int(after.id), None)
+            if user_name(after) != user_name(before):
+                await AsyncNecroDB().register_user(after)     # keep the name shown on results and leaderboards current
+
+    # Call this when a role is made, deleted, or edited (which may change which roles are admin roles)
+    async def on_server_role_change(self, role):
+        if self._on_our_server(role):
+            self._invalidate_admin_cache()
+
+    # Call this when a channel is made
+    async def on_channel_create(self, channel):
+        if self._on_our_server(channel):
+            self._index_channel(channel)
+
+    # Call this when a channel is deleted
+    async def on_channel_delete(self, channel):
+        if self._on_our_server(channel):
+            self._unindex_channel(channel)
+
+    # Call this when a channel's details (name, topic, etc.) change
+    async def on_channel_update(self, before, after):
+        if self._on_our_server(after):
+            self._unindex_channel(before)
+            self._index_channel(after)
         
     # Executes a command
     # cmd: [command.Command]
@@ -233,6 +307,68 @@ class Necrobot(object):
 
         # handle the command with the appropriate bot channel
         if cmd.is_private:
-            await self._pm_bot_channel.execute(cmd)
+            stats.increment('messages.dispatched')
+            await self._pm_bot_channel.enqueue(cmd)
         elif cmd.channel in self._bot_channels:
-            await self._bot_channels[cmd.channel].execute(cmd)
+            stats.increment('messages.dispatched')
+            await self._bot_channels[cmd.channel].enqueue(cmd)
+
+# Admin cache-------------------
+    # Returns the set of ids of roles that give admin access (by name, see Config.ADMIN_ROLE_NAMES)
+    def _get_admin_role_ids(self):
+        if self._admin_role_ids is None:
+            self._admin_role_ids = {role.id for role in self.server.roles if role.name in Config.ADMIN_ROLE_NAMES}
+        return self._admin_role_ids
+
+    # Forget the admin roles and every member's admin status; call when roles change
+    def _invalidate_admin_cache(self):
+        self._admin_role_ids = None
+        self._admin_status = {}
+
+# Lookup indexes----------------
+    # Rebuild the member and channel lookup tables from the server
+    def _build_indexes(self):
+        self._members_by_id = {}
+        self._members_by_name = {}
+        self._channels_by_id = {}
+        self._channels_by_name = {}
+        for member in self.server.members:
+            self._index_member(member)
+        for channel in self.server.channels:
+            self._index_channel(channel)
+
+    # True if the given member or channel belongs to the server we're reading commands on
+    def _on_our_server(self, member_or_channel):
+        server = getattr(member_or_channel, 'server', None)
+        return self.server is not None and server is not None and server.id == self.server.id
+
+    def _index_member(self, member):
+        self._unindex_member(member)
+        self._members_by_id[int(member.id)] = member
+        self._members_by_name.setdefault(member.display_name.lower(), []).append(member)
+
+    def _unindex_member(self, member):
+        old_member = self._members_by_id.pop(int(member.id), None)
+        for name in {member.display_name.lower(), old_member.display_name.lower() if old_member else None}:
+            _remove_with_id(self._members_by_name, name, member.id)
+
+    def _index_channel(self, channel):
+        self._unindex_channel(channel)
+        self._channels_by_id[int(channel.id)] = channel
+        self._channels_by_name.setdefault(channel.name, []).append(channel)
+
+    def _unindex_channel(self, channel):
+        old_channel = self._channels_by_id.pop(int(channel.id), None)
+        for name in {channel.name, old_channel.name if old_channel else None}:
+            _remove_with_id(self._channels_by_name, name, channel.id)
+
+
+# Remove everything with the given id from the list stored under key in the given dict (and the list itself, if this
+# leaves it empty)
+def _remove_with_id(dict_of_lists, key, discord_id):
+    entries = dict_of_lists.get(key)
+    if entries is None:
+        return
+    entries[:] = [entry for entry in entries if int(entry.id) != int(discord_id)]
+    if not entries:
+        del dict_of_lists[key]
@@ -1,42 +1,73 @@
-import mysql.connector
+import asyncio
+import concurrent.futures
 
 from .util.config import Config
+from .util import stats
+from .util.dbpool import ConnectionPool
 
+_pool = None
+_executor = None
+
+
+# Create the shared connection pool (and the threads that AsyncNecroDB runs queries on). Call once at startup, after
+# the config has been read.
+def init_pool():
+    global _pool, _executor
+    if _pool is not None:
+        _pool.close_all()
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=Config.MYSQL_POOL_SIZE)
+    _pool = ConnectionPool(
+        size=Config.MYSQL_POOL_SIZE,
+        idle_timeout=Config.MYSQL_POOL_IDLE_TIMEOUT_SEC,
+        user=Config.MYSQL_DB_USER,
+        password=Config.MYSQL_DB_PASSWD,
+        host=Config.MYSQL_DB_HOST,
+        database=Config.MYSQL_DB_NAME)
 
-class NecroDB(object):
 
-    def _connect(self):
-        self._db_conn = mysql.connector.connect(
-            user=Config.MYSQL_DB_USER,
-            password=Config.MYSQL_DB_PASSWD,
-            host=Config.MYSQL_DB_HOST,
-            database=Config.MYSQL_DB_NAME)
+# Returns the name stored for the given user in user_data. Every writer of user_data goes through this, so that the
+# names shown on race results and daily leaderboards (which are read from user_data) agree with each other.
+# member: [discord.Member or discord.User]
+def user_name(member):
+    return member.display_name
 
-    def _close(self):
-        self._db_conn.close()
+
+class NecroDB(object):
+    # Returns a context manager yielding a pooled connection to the database
+    @staticmethod
+    def _connect():
+        if _pool is None:
+            init_pool()
+        return _pool.connection()
 
     def set_prefs(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "INSERT INTO user_prefs "
-            "(discord_id, hidespoilerchat, dailyalert, racealert) "
-            "VALUES (%s,%s,%s,%s) "
-            "ON DUPLICATE KEY UPDATE "
-            "discord_id=VALUES(discord_id), "
-            "hidespoilerchat=VALUES(hidespoilerchat), "
-            "dailyalert=VALUES(dailyalert), "
-            "racealert=VALUES(racealert)", params)
-        self._db_conn.commit()
-        self._close()
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "INSERT INTO user_prefs "
+                "(discord_id, hidespoilerchat, dailyalert, racealert) "
+                "VALUES (%s,%s,%s,%s) "
+                "ON DUPLICATE KEY UPDATE "
+                "discord_id=VALUES(discord_id), "
+                "hidespoilerchat=VALUES(hidespoilerchat), "
+                "dailyalert=VALUES(dailyalert), "
+                "racealert=VALUES(racealert)", params)
+            db_conn.commit()
 
     def get_prefs(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute("""SELECT * FROM user_prefs WHERE discord_id=%s""", params)
-        prefs = cursor.fetchall()
-        self._close()
-        return prefs
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute("""SELECT * FROM user_prefs WHERE discord_id=%s""", params)
+            prefs = cursor.fetchall()
+            return prefs
+
+    def get_all_prefs(self):
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute("""SELECT discord_id, dailyalert, racealert FROM user_prefs""")
+            prefs = cursor.fetchall()
+            return prefs
 
     def get_all_matching_prefs(self, pref_type, params):
         if pref_type == "hidespoilerchat":
@@ -45,210 +76,247 @@ class NecroDB(object):
             query = """SELECT discord_id FROM user_prefs WHERE dailyalert=%s"""
         elif pref_type == "racealert":
             query = """SELECT discord_id FROM user_prefs WHERE racealert=%s"""
-        self._connect()
-        cursor = self._db_conn.cursor()
-        # noinspection PyUnboundLocalVariable
-        cursor.execute(query, params)
-        prefs = cursor.fetchall()
-        self._close()
-        return prefs
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            # noinspection PyUnboundLocalVariable
+            cursor.execute(query, params)
+            prefs = cursor.fetchall()
+            return prefs
 
+    # Record a finalized race. The racer and user rows are written with one multi-row insert each, in a single
+    # transaction. Returns the time taken, in seconds.
     def record_race(self, race):
-        self._connect()
-        db_cur = self._db_conn.cursor(buffered=True)
-        db_cur.execute(
-            "SELECT race_id FROM race_data ORDER BY race_id DESC LIMIT 1")
-        new_raceid = 0
-        for row in db_cur:
-            new_raceid = row[0] + 1
-            break
-
-        race_params = (new_raceid,
-                       race.start_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                       race.race_info.character_str,
-                       race.race_info.descriptor,
-                       race.race_info.flags,
-                       race.race_info.seed,)
-
-        db_cur.execute(
-            "INSERT INTO race_data "
-            "(race_id, timestamp, character_name, descriptor, flags, seed) "
-            "VALUES (%s,%s,%s,%s,%s,%s)",
-            race_params)
-
-        racer_list = []
-        max_time = 0
-        for racer in race.racers:
-            racer_list.append(racer)
-            if racer.is_finished:
-                max_time = max(racer.time, max_time)
-        max_time += 1
-
-        racer_list.sort(key=lambda r: r.time if r.is_finished else max_time)
-
-        rank = 1
-        for racer in racer_list:
-            racer_params = (new_raceid, racer.id, racer.time, rank, racer.igt, racer.comment, racer.level)
-            db_cur.execute(
-                "INSERT INTO racer_data "
-                "(race_id, discord_id, time, rank, igt, comment, level) "
-                "VALUES (%s,%s,%s,%s,%s,%s,%s)",
-                racer_params)
-            if racer.is_finished:
-                rank += 1
-
-            user_params = (racer.id, racer.name)
-            db_cur.execute(
-                'INSERT INTO user_data '
-                '(discord_id, name) '
-                'VALUES (%s,%s) '
-                'ON DUPLICATE KEY UPDATE '
-                'discord_id=VALUES(discord_id), '
-                'name=VALUES(name)',
-                user_params)
-
-        self._db_conn.commit()
-        self._close()
-
-    def register_all_users(self, members):
-        self._connect()
-        db_cur = self._db_conn.cursor()
-        for member in members:
-            params = (member.id, member.name,)
-            db_cur.execute(
-                "INSERT IGNORE INTO user_data (discord_id, name) VALUES (%s,%s)",
-                params)
-        self._db_conn.commit()
-        self._close()
+        with stats.timed('db.record_race') as timer:
+            with self._connect() as db_conn:
+                db_cur = db_conn.cursor()
+                race_params = (race.start_datetime.strftime('%Y-%m-%d %H:%M:%S'),
+                               race.race_info.character_str,
+                               race.race_info.descriptor,
+                               race.race_info.flags,
+                               race.race_info.seed,)
+
+                # race_id is AUTO_INCREMENT, so concurrent finalizations can't be handed the same id
+                db_cur.execute(
+                    "INSERT INTO race_data "
+                    "(timestamp, character_name, descriptor, flags, seed) "
+                    "VALUES (%s,%s,%s,%s,%s)",
+                    race_params)
+                new_raceid = db_cur.lastrowid
+
+                racer_rows = []
+                user_rows = []
+                rank = 1
+                for racer in race.standings:
+                    racer_rows.append((new_raceid, racer.id, racer.time, rank, racer.igt, racer.comment, racer.level))
+                    user_rows.append((racer.id, user_name(racer.member)))
+                    if racer.is_finished:
+                        rank += 1
 
+                if racer_rows:
+                    db_cur.executemany(
+                        "INSERT INTO racer_data "
+                        "(race_id, discord_id, time, rank, igt, comment, level) "
+                        "VALUES (%s,%s,%s,%s,%s,%s,%s)",
+                        racer_rows)
+                    db_cur.executemany(
+                        'INSERT INTO user_data '
+                        '(discord_id, name) '
+                        'VALUES (%s,%s) '
+                        'ON DUPLICATE KEY UPDATE '
+                        'discord_id=VALUES(discord_id), '
+                        'name=VALUES(name)',
+                        user_rows)
+
+                db_conn.commit()
+        return timer.elapsed
+
+    # Registers the given members in user_data, using multi-row inserts of at most Config.USER_REGISTER_CHUNK_SIZE
+    # rows. Normally members already in user_data are left alone. If only_changed is True, the table is read first and
+    # only members whose id or name isn't already there are written (so changed names are updated).
+    # Returns a pair (number of rows written, seconds taken).
+    def register_all_users(self, members, only_changed=False):
+        with stats.timed('db.register_all_users') as timer:
+            rows = [(int(member.id), user_name(member)) for member in members]
+            with self._connect() as db_conn:
+                db_cur = db_conn.cursor()
+                if only_changed:
+                    db_cur.execute("SELECT discord_id, name FROM user_data")
+                    known_rows = set(db_cur.fetchall())
+                    rows = [row for row in rows if row not in known_rows]
+                    query = "INSERT INTO user_data (discord_id, name) VALUES (%s,%s) " \
+                            "ON DUPLICATE KEY UPDATE name=VALUES(name)"
+                else:
+                    query = "INSERT IGNORE INTO user_data (discord_id, name) VALUES (%s,%s)"
+
+                rows_written = 0
+                chunk_size = max(1, Config.USER_REGISTER_CHUNK_SIZE)
+                for i in range(0, len(rows), chunk_size):
+                    chunk = rows[i:i + chunk_size]
+                    db_cur.executemany(query, chunk)
+                    rows_written += len(chunk) if only_changed else db_cur.rowcount
+                db_conn.commit()
+        return rows_written, timer.elapsed
+
+    # Registers the given member in user_data, updating their name if they are already there
     def register_user(self, member):
-        self._connect()
-        params = (member.id, member.name,)
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "INSERT INTO user_data (discord_id, name) VALUES (%s,%s)",
-            params)
-        self._db_conn.commit()
-        self._close()
+        with self._connect() as db_conn:
+            params = (member.id, user_name(member),)
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "INSERT INTO user_data (discord_id, name) VALUES (%s,%s) "
+                "ON DUPLICATE KEY UPDATE name=VALUES(name)",
+                params)
+            db_conn.commit()
 
     def get_daily_seed(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "SELECT seed FROM daily_data WHERE daily_id=%s AND type=%s",
-            params)
-        seed = cursor.fetchall()
-        self._close()
-        return seed
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "SELECT seed FROM daily_data WHERE daily_id=%s AND type=%s",
+                params)
+            seed = cursor.fetchall()
+            return seed
 
     def get_daily_times(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "SELECT user_data.name,daily_races.level,daily_races.time "
-            "FROM daily_races INNER JOIN user_data ON daily_races.discord_id=user_data.discord_id "
-            "WHERE daily_races.daily_id=%s AND daily_races.type=%s "
-            "ORDER BY daily_races.level DESC, daily_races.time ASC",
-            params)
-        times = cursor.fetchall()
-        self._close()
-        return times
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "SELECT daily_races.discord_id,user_data.name,daily_races.level,daily_races.time "
+                "FROM daily_races INNER JOIN user_data ON daily_races.discord_id=user_data.discord_id "
+                "WHERE daily_races.daily_id=%s AND daily_races.type=%s "
+                "ORDER BY daily_races.level DESC, daily_races.time ASC",
+                params)
+            times = cursor.fetchall()
+            return times
 
     def has_submitted_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor(buffered=True)
-        cursor.execute(
-            "SELECT level FROM daily_races WHERE discord_id=%s AND daily_id=%s AND type=%s",
-            params)
-        for row in cursor:
-            if row[0] != -1:
-                self._close()
-                return True
-        self._close()
-        return False
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor(buffered=True)
+            cursor.execute(
+                "SELECT level FROM daily_races WHERE discord_id=%s AND daily_id=%s AND type=%s",
+                params)
+            for row in cursor:
+                if row[0] != -1:
+                    return True
+            return False
 
     def has_registered_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor(buffered=True)
-        cursor.execute(
-            "SELECT * FROM daily_races WHERE discord_id=%s AND daily_id=%s AND type=%s",
-            params)
-        for _ in cursor:
-            self._close()
-            return True
-        self._close()
-        return False
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor(buffered=True)
+            cursor.execute(
+                "SELECT * FROM daily_races WHERE discord_id=%s AND daily_id=%s AND type=%s",
+                params)
+            for _ in cursor:
+                return True
+            return False
 
     def register_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "INSERT INTO daily_races "
-            "(discord_id, daily_id, type, level, time) "
-            "VALUES (%s,%s,%s,%s,%s) "
-            "ON DUPLICATE KEY UPDATE "
-            "discord_id=VALUES(discord_id), "
-            "daily_id=VALUES(daily_id), "
-            "type=VALUES(type), "
-            "level=VALUES(level), "
-            "time=VALUES(time)",
-            params)
-        self._db_conn.commit()
-        self._close()
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "INSERT INTO daily_races "
+                "(discord_id, daily_id, type, level, time) "
+                "VALUES (%s,%s,%s,%s,%s) "
+                "ON DUPLICATE KEY UPDATE "
+                "discord_id=VALUES(discord_id), "
+                "daily_id=VALUES(daily_id), "
+                "type=VALUES(type), "
+                "level=VALUES(level), "
+                "time=VALUES(time)",
+                params)
+            db_conn.commit()
+
+    # Registers every given user for the given daily (with no submission), using multi-row inserts of at most
+    # Config.USER_REGISTER_CHUNK_SIZE rows; users with an existing entry for that daily are left alone.
+    # Returns a pair (number of rows written, seconds taken).
+    def register_all_daily(self, discord_ids, daily_id, daily_type):
+        with stats.timed('db.register_all_daily') as timer:
+            rows = [(int(discord_id), daily_id, daily_type, -1, -1) for discord_id in discord_ids]
+            with self._connect() as db_conn:
+                db_cur = db_conn.cursor()
+                rows_written = 0
+                chunk_size = max(1, Config.USER_REGISTER_CHUNK_SIZE)
+                for i in range(0, len(rows), chunk_size):
+                    db_cur.executemany(
+                        "INSERT IGNORE INTO daily_races (discord_id, daily_id, type, level, time) "
+                        "VALUES (%s,%s,%s,%s,%s)",
+                        rows[i:i + chunk_size])
+                    rows_written += db_cur.rowcount
+                db_conn.commit()
+        return rows_written, timer.elapsed
 
     def registered_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor(buffered=True)
-        cursor.execute(
-            "SELECT daily_id FROM daily_races WHERE discord_id=%s AND type=%s ORDER BY daily_id DESC",
-            params)
-        dailies = cursor.fetchall()
-        self._close()
-        return dailies
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor(buffered=True)
+            cursor.execute(
+                "SELECT daily_id FROM daily_races WHERE discord_id=%s AND type=%s ORDER BY daily_id DESC",
+                params)
+            dailies = cursor.fetchall()
+            return dailies
 
     def submitted_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor(buffered=True)
-        cursor.execute(
-            "SELECT daily_id,level FROM daily_races WHERE discord_id=%s AND type=%s ORDER BY daily_id DESC",
-            params)
-        dailies = cursor.fetchall()
-        self._close()
-        return dailies
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor(buffered=True)
+            cursor.execute(
+                "SELECT daily_id,level FROM daily_races WHERE discord_id=%s AND type=%s ORDER BY daily_id DESC",
+                params)
+            dailies = cursor.fetchall()
+            return dailies
 
     def delete_from_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "UPDATE daily_races SET level=%s WHERE discord_id=%s AND daily_id=%s AND type=%s",
-            params)
-        self._db_conn.commit()
-        self._close()
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "UPDATE daily_races SET level=%s WHERE discord_id=%s AND daily_id=%s AND type=%s",
+                params)
+            db_conn.commit()
 
     def create_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "INSERT INTO daily_data (daily_id, type, seed, msg_id) VALUES (%s,%s,%s,%s)",
-            params)
-        self._db_conn.commit()
-        self._close()
-
-    def update_daily(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "UPDATE daily_data SET msg_id=%s WHERE daily_id=%s AND type=%s",
-            params)
-        self._db_conn.commit()
-        self._close()
-
-    def get_daily_message_id(self, params):
-        self._connect()
-        cursor = self._db_conn.cursor()
-        cursor.execute(
-            "SELECT msg_id FROM daily_data WHERE daily_id=%s AND type=%s",
-            params)
-        msg_id = cursor.fetchall()
-        self._close()
-        return msg_id
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "INSERT INTO daily_data (daily_id, type, seed) VALUES (%s,%s,%s)",
+                params)
+            db_conn.commit()
+
+    def set_daily_leaderboard_msg(self, params):
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "INSERT INTO daily_leaderboard_msgs (daily_id, type, page, msg_id) "
+                "VALUES (%s,%s,%s,%s) "
+                "ON DUPLICATE KEY UPDATE "
+                "msg_id=VALUES(msg_id)",
+                params)
+            db_conn.commit()
+
+    def delete_daily_leaderboard_msgs(self, params):
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "DELETE FROM daily_leaderboard_msgs WHERE daily_id=%s AND type=%s AND page>=%s",
+                params)
+            db_conn.commit()
+
+    def get_daily_leaderboard_msgs(self, params):
+        with self._connect() as db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute(
+                "SELECT page, msg_id FROM daily_leaderboard_msgs WHERE daily_id=%s AND type=%s ORDER BY page",
+                params)
+            msgs = cursor.fetchall()
+            return msgs
+
+
+# Awaitable facade over NecroDB. Has the same methods as NecroDB, but each is a coroutine that runs the query on a
+# dedicated thread pool, so that a slow query doesn't stall the event loop (and every race countdown with it).
+class AsyncNecroDB(object):
+    def __getattr__(self, name):
+        db_method = getattr(NecroDB(), name)
+
+        async def run_in_executor(*args):
+            if _executor is None:
+                init_pool()
+            return await asyncio.get_event_loop().run_in_executor(_executor, db_method, *args)
+
+        return run_in_executor
@@ -1,10 +1,25 @@
+import asyncio
+
 from .userprefs import UserPrefs
-from ..necrodb import NecroDB
+from ..necrodb import AsyncNecroDB
+from ..util import console
+
+
+# The preferences that can be searched on with get_all_matching
+INDEXED_PREFS = ['daily_alert', 'race_alert']
 
 
+# Keeps every user's preferences in memory (keyed by discord id), loaded from the database at startup. Reads are served
+# from memory; writes update memory immediately and are written through to the database in the background.
 class PrefsManager(object):
     def __init__(self, necrobot):
         self.necrobot = necrobot
+        self._prefs = {}                    # maps discord ids (as ints) onto UserPrefs
+        self._subscribers = {}              # maps (pref name, value) pairs onto sets of discord ids
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._last_write = None             # the Future for the most recent write-through
+        asyncio.ensure_future(self._preload())
 
     def refresh(self):
         pass
@@ -12,57 +27,88 @@ class PrefsManager(object):
     def close(self):
         pass
 
-    def set_prefs(self, user_prefs, user):
-        prefs = self.get_prefs(user)
+    async def set_prefs(self, user_prefs, user):
+        prefs = await self.get_prefs(user)
         prefs.merge_prefs(user_prefs)
+        self._store(int(user.id), prefs)
 
         params = (int(user.id), False, 2 if prefs.daily_alert else 0, 1 if prefs.race_alert else 0,)
-        print(params)
-        NecroDB().set_prefs(params)
+        self._last_write = asyncio.ensure_future(self._write_through(self._last_write, params))
 
-    @staticmethod
-    def get_prefs(user):
+    async def get_prefs(self, user):
+        await self._ensure_loaded()
         user_prefs = UserPrefs()
-        params = (int(user.id),)
-        for row in NecroDB().get_prefs(params):
-            user_prefs.daily_alert = (row[2] != 0)
-            user_prefs.race_alert = (row[3] != 0)
+        cached_prefs = self._prefs.get(int(user.id))
+        if cached_prefs is not None:
+            user_prefs.merge_prefs(cached_prefs)
         return user_prefs
 
-    # get all user id's matching the given user prefs
-    def get_all_matching(self, user_prefs):
-        users_matching_dailyalert = []
-        users_matching_racealert = []
-        lists_to_use = []
+    # get all members matching the given user prefs. Takes time proportional to the number of matching users.
+    async def get_all_matching(self, user_prefs):
+        await self._ensure_loaded()
 
-        if user_prefs.daily_alert is not None:
-            lists_to_use.append(users_matching_dailyalert)
-            params = (2,) if user_prefs.daily_alert else (0,)
+        id_sets = []
+        for pref_name in INDEXED_PREFS:
+            value = getattr(user_prefs, pref_name)
+            if value is not None:
+                id_sets.append(self._subscribers.get((pref_name, bool(value)), set()))
+        if not id_sets:
+            return []
 
-            for row in NecroDB().get_all_matching_prefs("dailyalert", params):
-                userid = row[0]
-                for member in self.necrobot.server.members:
-                    if int(member.id) == int(userid):
-                        users_matching_dailyalert.append(member)
+        id_sets.sort(key=len)
+        matching_ids = id_sets[0].intersection(*id_sets[1:])
 
-        if user_prefs.race_alert is not None:
-            lists_to_use.append(users_matching_racealert)
-            params = (1,) if user_prefs.race_alert else (0,)
+        users_matching = []
+        for user_id in matching_ids:
+            member = self.necrobot.get_member_by_id(user_id)
+            if member is not None:
+                users_matching.append(member)
+        return users_matching
 
-            for row in NecroDB().get_all_matching_prefs("racealert", params):
-                userid = row[0]
-                for member in self.necrobot.server.members:
-                    if int(member.id) == int(userid):
-                        users_matching_racealert.append(member)
+    # Start loading preferences at startup. If this fails, the load is tried again the next time prefs are needed.
+    async def _preload(self):
+        try:
+            await self._ensure_loaded()
+        except Exception as e:
+            console.error('Failed to load user prefs: {0}'.format(e))
 
-        users_matching = []
-        if lists_to_use:
-            for member in lists_to_use[0]:
-                in_intersection = True
-                for l in lists_to_use:
-                    if member not in l:
-                        in_intersection = False
-                if in_intersection:
-                    users_matching.append(member)
+    # Load all preferences from the database, if not done already. Raises if the database can't be read, in which
+    # case nothing is marked loaded and the next call tries again.
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
 
-        return users_matching
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for row in await AsyncNecroDB().get_all_prefs():
+                user_id = int(row[0])
+                if user_id not in self._prefs:     # don't clobber anything set while we were loading
+                    prefs = UserPrefs()
+                    prefs.daily_alert = (row[1] != 0)
+                    prefs.race_alert = (row[2] != 0)
+                    self._store(user_id, prefs)
+            self._loaded = True
+
+    # Put the given prefs in the cache, and update the subscriber index to match
+    def _store(self, user_id, prefs):
+        old_prefs = self._prefs.get(user_id)
+        for pref_name in INDEXED_PREFS:
+            if old_prefs is not None:
+                old_value = getattr(old_prefs, pref_name)
+                if old_value is not None:
+                    self._subscribers[(pref_name, bool(old_value))].discard(user_id)
+            new_value = getattr(prefs, pref_name)
+            if new_value is not None:
+                self._subscribers.setdefault((pref_name, bool(new_value)), set()).add(user_id)
+        self._prefs[user_id] = prefs
+
+    # Write the given prefs to the database once the previous write (if any) is done, so writes land in order
+    @staticmethod
+    async def _write_through(previous_write, params):
+        if previous_write is not None:
+            await asyncio.wait([previous_write])
+        try:
+            await AsyncNecroDB().set_prefs(params)
+        except Exception as e:
+            console.error('Failed to write user prefs {0}: {1}'.format(params, e))
@@ -0,0 +1,84 @@
+# Sends a countdown (e.g. "5", "4", ..., "GO!") to a race room so that each line lands on time. Every deadline is
+# fixed before the countdown starts, so a slow send doesn't push back the lines after it; and each line is sent early
+# by the recent average send latency, without waiting for the previous send to complete. If the countdown is cancelled,
+# so are any lines it has handed off that haven't been sent yet.
+
+import asyncio
+import logging
+import time
+
+from ..util import stats
+from ..util.config import Config
+
+_EWMA_WEIGHT = 0.3          # weight given to each new latency measurement in the running estimate
+
+_send_latency = None        # running estimate (exponentially weighted moving average) of seconds taken by a send
+
+
+# Returns the number of seconds by which to send a line ahead of its deadline
+def send_lead_time():
+    estimate = Config.COUNTDOWN_INITIAL_LATENCY_SEC if _send_latency is None else _send_latency
+    return min(max(estimate, 0.0), Config.COUNTDOWN_MAX_LEAD_SEC)
+
+
+def _record_send_latency(latency):
+    global _send_latency
+    if _send_latency is None:
+        _send_latency = latency
+    else:
+        _send_latency = _EWMA_WEIGHT * latency + (1 - _EWMA_WEIGHT) * _send_latency
+
+
+class Countdown(object):
+    # write: [coroutine function(string)] sends a timing-critical line to the room, returning the discord.Message
+    # on_go_sent: [function(discord.Message)] called with the 'GO!' message once it has been sent
+    def __init__(self, write, on_go_sent=None):
+        self._write = write
+        self._on_go_sent = on_go_sent
+        self._sends = []                    # Futures for the lines handed off so far
+        self._cancelled = False
+
+    # Send each line of ticks (a list of pairs (deadline, text), where deadlines are system clock times) so that it
+    # lands at its deadline, and then 'GO!' so that it lands at go_deadline. Returns as soon as 'GO!' has been sent off
+    # (which is slightly before go_deadline). If this is cancelled, the lines it has handed off are cancelled too.
+    async def run(self, ticks, go_deadline):
+        try:
+            for deadline, text in ticks:
+                await self._sleep_until(deadline - send_lead_time())
+                self._sends.append(asyncio.ensure_future(self._send(text, deadline, 'countdown.tick_error')))
+            await self._sleep_until(go_deadline - send_lead_time())
+            self._sends.append(
+                asyncio.ensure_future(self._send('GO!', go_deadline, 'countdown.go_error', self._on_go_sent)))
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    # Stop any lines handed off but not yet sent from going out, and don't report the GO! message if it does go out
+    def cancel(self):
+        self._cancelled = True
+        for send in self._sends:
+            send.cancel()
+
+    @staticmethod
+    async def _sleep_until(systemtime):
+        sleep_time = systemtime - time.monotonic()
+        if sleep_time > 0:
+            await asyncio.sleep(sleep_time)
+
+    # Send the text, and record how far from the deadline it landed (positive if late) and how long the send took.
+    # Passes the sent message to on_sent, if given.
+    async def _send(self, text, deadline, stat_name, on_sent=None):
+        send_begin = time.monotonic()
+        try:
+            message = await self._write(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.getLogger('discord').exception('Exception while sending countdown line "{0}".'.format(text))
+            return
+
+        send_end = time.monotonic()
+        _record_send_latency(send_end - send_begin)
+        stats.observe(stat_name, send_end - deadline)
+        if on_sent is not None and message is not None and not self._cancelled:
+            on_sent(message)
@@ -1,14 +1,17 @@
 import asyncio
+import bisect
+import collections
 import datetime
 import time
 from enum import IntEnum
 
 from . import racetime
+from .countdown import Countdown
 from .raceinfo import RaceInfo
-from .racer import Racer
-from ..necrodb import NecroDB
+from .racer import Racer, RacerStatus
+from ..necrodb import AsyncNecroDB
 from ..util.config import Config
-from ..util import console
+from ..util import console, stats
 from ..util.ordinal import ordinal
 
 
@@ -50,7 +53,13 @@ class Race(object):
     def __init__(self, race_room):
         self.room = race_room                     # The RaceRoom object managing this race
         self.race_info = RaceInfo.copy(race_room.race_info)
-        self.racers = []                          # A list of Racer
+        self.racers = collections.OrderedDict()   # Maps discord ids (as ints) onto Racers, in order of entry
+        self._racer_counts = collections.Counter()  # Maps RacerStatuses onto the number of racers in that state
+        self._entry_count = 0                     # The number of times a racer has entered (for breaking ties)
+        self._entry_numbers = {}                  # Maps discord ids (as ints) onto the racer's entry number
+        self._finish_order = []                   # Keys (time, entry number, discord id) of finished racers, sorted
+        self._finish_keys = {}                    # Maps discord ids (as ints) of finished racers onto their keys
+        self._leaderboard_text = None             # Cached result of leaderboard_text; None if out of date
 
         self._status = RaceStatus.uninitialized   # The status of this race
 
@@ -58,11 +67,15 @@ class Race(object):
         self._start_datetime = None               # UTC time for the beginning of the race
         self._adj_start_time = float(0)           # System clock time for the beginning of the race (modified by pause)
         self._last_pause_time = float(0)          # System clock time for last time we called pause()
+        self._last_resume_time = float(0)         # System clock time at which the race timer last started running
+        self._discord_anchor = None               # (UTC datetime, system clock time) of the last GO!, as stamped by
+                                                  # discord and as meant by us; maps discord times onto the system clock
 
         self._last_no_entrants_time = None        # System clock time for the last time the race had zero entrants
 
         self._delay_record = False                # If true, delay an extra Config.FINALIZE_TIME_SEC before recording
         self._countdown_future = None             # The Future object for the race countdown
+        self._unpause_future = None               # The Future object for the unpause countdown
         self._finalize_future = None              # The Future object for the finalization countdown
 
 # Race data
@@ -70,12 +83,17 @@ class Race(object):
     @property
     def current_time(self):
         if self._status == RaceStatus.paused:
-            return int(100 * (self._last_pause_time - self._adj_start_time))
+            return self.race_time_at(self._last_pause_time)
         elif self._status == RaceStatus.racing:
-            return int(100 * (time.monotonic() - self._adj_start_time))
+            return self.race_time_at(time.monotonic())
         else:
             return None
 
+    # Returns the race time (in hundredths of a second) at the given system clock time, which should be no earlier than
+    # the last time the race timer started running
+    def race_time_at(self, systemtime):
+        return max(0, int(100 * (systemtime - self._adj_start_time)))
+
     # Returns the current time elapsed as a string "[m]m:ss.hh"
     @property
     def current_time_str(self):
@@ -146,33 +164,25 @@ class Race(object):
     # Returns the number of racers not in the 'ready' state
     @property
     def num_not_ready(self):
-        num = 0
-        for racer in self.racers:
-            if not racer.is_ready:
-                num += 1
-        return num
+        return len(self.racers) - self._racer_counts[RacerStatus.ready]
 
     # Return the number of racers in the 'finished' state
     @property
     def num_finished(self):
-        num = 0
-        for racer in self.racers:
-            if racer.is_finished:
-                num += 1
-        return num
+        return self._racer_counts[RacerStatus.finished]
+
+    # Return the number of racers in the 'finished' or 'forfeit' states
+    @property
+    def num_done_racing(self):
+        return self._racer_counts[RacerStatus.finished] + self._racer_counts[RacerStatus.forfeit]
 
     # True if the given discord.User is entered in the race
     def has_racer(self, racer_usr):
-        for racer in self.racers:
-            if int(racer.member.id) == int(racer_usr.id):
-                return True
-        return False
+        return int(racer_usr.id) in self.racers
 
     # Returns the given discord.User as a Racer, if possible
     def get_racer(self, racer_usr):
-        for racer in self.racers:
-            if int(racer.member.id) == int(racer_usr.id):
-                return racer
+        return self.racers.get(int(racer_usr.id))
 
 # Leaderboard data
     # Returns the string to go in the topic for the leaderboard
@@ -197,36 +207,33 @@ class Race(object):
 
         return self.race_info.format_str + room_rider + seed_str + '\n'
 
+    # Returns the racers in standings order: (1) Finished racers, by time; (2) Forfeit racers; (3) Racers still racing
+    # (or not yet started). Racers within (2) and (3), or with equal times, are in order of entry.
+    @property
+    def standings(self):
+        standings = [self.racers[racer_id] for _, _, racer_id in self._finish_order]
+        standings += [racer for racer in self.racers.values() if racer.is_forfeit]
+        standings += [racer for racer in self.racers.values() if not racer.is_done_racing]
+        return standings
+
     # Returns a list of racers and their statuses.
     @property
-    def leaderboard_text(self, shortened=False):
-        char_limit = int(1900)      # The character limit on discord messages
-
-        racer_list = []
-        max_name_len = 0
-        max_time = 0
-        for racer in self.racers:
-            max_name_len = max(max_name_len, len(racer.name))
-            racer_list.append(racer)
-            if racer.is_finished:
-                max_time = max(racer.time, max_time)
-        max_time += 1
-
-        # Sort racers: (1) Finished racers, by time; (2) Forfeit racers; (3) Racers still racing
-        racer_list.sort(key=lambda r: r.time if r.is_finished else (max_time if r.is_forfeit else max_time+1))
-
-        text = ''
-        rank = int(0)
-        for racer in racer_list:
-            rank += 1
+    def leaderboard_text(self):
+        if self._leaderboard_text is None:
+            char_limit = int(1900)      # The character limit on discord messages
+            self._leaderboard_text = self._render_leaderboard_text(shortened=False)
+            if len(self._leaderboard_text) > char_limit:
+                self._leaderboard_text = self._render_leaderboard_text(shortened=True)
+        return self._leaderboard_text
+
+    def _render_leaderboard_text(self, shortened):
+        max_name_len = max([len(racer.name) for racer in self.racers.values()], default=0)
+        lines = []
+        for rank, racer in enumerate(self.standings, start=1):
             rank_str = '{0: >4} '.format(str(rank) + '.' if racer.is_finished else ' ')
             stat_str = racer.short_status_str if shortened else racer.status_str
-            text += (rank_str + racer.name + (' ' * (max_name_len - len(racer.name))) + ' --- ' + stat_str + '\n')
-
-        if len(text) > char_limit and not shortened:
-            return self.leaderboard_text(shortened=True)
-        else:
-            return text
+            lines.append(rank_str + racer.name + (' ' * (max_name_len - len(racer.name))) + ' --- ' + stat_str + '\n')
+        return ''.join(lines)
 
 # Public methods (all coroutines)
     # Sets up the leaderboard, etc., for the race
@@ -251,18 +258,20 @@ class Race(object):
             self._countdown_future = asyncio.ensure_future(self._race_countdown())
             asyncio.ensure_future(self.room.update_leaderboard())
 
-    # Pause the race timer.
-    async def pause(self):
+    # Pause the race timer, as of the given UTC datetime (e.g. when the .pause message was sent; defaults to now).
+    async def pause(self, sent_at=None):
         if self._status == RaceStatus.racing:
             self._status = RaceStatus.paused
-            self._last_pause_time = time.monotonic()
+            self._last_pause_time = self._command_systemtime(sent_at)
             asyncio.ensure_future(self.room.update_leaderboard())
             return True
         return False
 
-    # Unpause the race timer.
+    # Unpause the race timer, after a countdown. Returns once the countdown has started, so that commands queued behind
+    # this one (e.g. a .done) don't wait for it; does nothing if an unpause countdown is already running.
     async def unpause(self):
-        await self._unpause_countdown()
+        if self._unpause_future is None or self._unpause_future.done():
+            self._unpause_future = asyncio.ensure_future(self._unpause_countdown())
 
     # Enters the given discord Member in the race
     async def enter_member(self, racer_member):
@@ -291,7 +300,10 @@ class Race(object):
             return
 
         if self.has_racer(racer_member):
-            self.racers = [r for r in self.racers if int(r.member.id) != int(racer_member.id)]
+            racer = self.racers.pop(int(racer_member.id))
+            self._racer_counts[racer.state] -= 1
+            del self._entry_numbers[racer.id]
+            self._leaderboard_text = None
             if not self.racers:
                 self._last_no_entrants_time = time.monotonic()
             if (len(self.racers) < 2 and not self.race_info.can_be_solo) or len(self.racers) < 1:
@@ -359,8 +371,9 @@ class Race(object):
         else:
             await self.room.write("Can't unready!")
 
-    # Puts the given Racer in the 'finished' state and gets their time
-    async def finish_member(self, racer_member):
+    # Puts the given Racer in the 'finished' state and gets their time, as of the given UTC datetime (e.g. when the
+    # .done message was sent; defaults to now)
+    async def finish_member(self, racer_member, sent_at=None):
         if not self._status == RaceStatus.racing or self._status == RaceStatus.completed:
             return
 
@@ -368,12 +381,15 @@ class Race(object):
         if racer is None:
             return
 
-        if racer.finish(self.current_time):
+        if racer.finish(self.race_time_at(self._command_systemtime(sent_at))):
             self._status = RaceStatus.racing
+            # Commands are timed from when they were sent, so a racer processed later may still have finished earlier
+            # than someone already announced; their place is where their time falls among the finishers.
+            place = bisect.bisect_left(self._finish_order, self._finish_keys[racer.id]) + 1
             await self.room.write(
                 '{0} has finished in {1} place with a time of {2}.'.format(
                     racer_member.mention,
-                    ordinal(self.num_finished),
+                    ordinal(place),
                     racer.time_str))
             await self._check_for_race_end()
             await self.room.update_leaderboard()
@@ -397,18 +413,19 @@ class Race(object):
             await self.room.write('{0} continues to race!'.format(racer_member.mention))
             await self.room.update_leaderboard()
 
-    async def forfeit_racer(self, racer):
+    async def forfeit_racer(self, racer, sent_at=None):
         if self.before_race or self.final:
             return
 
-        await self._do_forfeit_racer(racer)
+        await self._do_forfeit_racer(racer, sent_at)
         await self.room.write('{0} has forfeit the race.'.format(racer.member.mention))
 
-    # Puts the given Racer in the 'forfeit' state
-    async def forfeit_member(self, racer_member):
+    # Puts the given Racer in the 'forfeit' state, as of the given UTC datetime (e.g. when the .forfeit message was
+    # sent; defaults to now)
+    async def forfeit_member(self, racer_member, sent_at=None):
         racer = self.get_racer(racer_member)
         if racer is not None:
-            await self.forfeit_racer(racer)
+            await self.forfeit_racer(racer, sent_at)
 
     # Attempt to put the given Racer in the 'racing' state if they had forfeit
     async def unforfeit_member(self, racer_member):
@@ -432,7 +449,7 @@ class Race(object):
     # Forfeits all racers that have not yet finished
     async def forfeit_all_remaining(self):
         if not self.before_race:
-            for racer in self.racers:
+            for racer in self.racers.values():
                 if racer.is_racing:
                     await self._do_forfeit_racer(racer)
 
@@ -446,6 +463,7 @@ class Race(object):
             return
 
         racer.add_comment(comment_str[:255])
+        self._leaderboard_text = None
         await self.room.update_leaderboard()
 
     # Adds a death for the given member at the given level and causes them to forfeit
@@ -461,6 +479,7 @@ class Race(object):
         await self.room.write('{0} has forfeit the race.'.format(racer_member.mention))
         if not level == -1:
             racer.level = level
+            self._leaderboard_text = None
 
     # Adds an in-game time for the given member
     async def set_igt_for_member(self, racer_member, igt):
@@ -473,11 +492,12 @@ class Race(object):
 
         if igt != -1 and racer.is_done_racing:
             racer.igt = igt
+            self._leaderboard_text = None
             await self.room.update_leaderboard()
 
     # Kicks the specified racers from the race (they can re-enter)
     async def kick_racers(self, names_to_kick):
-        for racer in self.racers:
+        for racer in list(self.racers.values()):
             if racer.name.lower() in names_to_kick:
                 await self.unenter_member(racer.member)
 
@@ -490,33 +510,52 @@ class Race(object):
         await self.room.update_leaderboard()
 
 # Private methods (all coroutines)
+    # Keeps the racer counts and standings up to date. Called by a Racer whenever its state changes.
+    def _on_racer_state_change(self, racer, old_state, new_state):
+        self._racer_counts[old_state] -= 1
+        self._racer_counts[new_state] += 1
+
+        if old_state == RacerStatus.finished:
+            old_key = self._finish_keys.pop(racer.id)
+            del self._finish_order[bisect.bisect_left(self._finish_order, old_key)]
+        if new_state == RacerStatus.finished:
+            new_key = (racer.time, self._entry_numbers[racer.id], racer.id)
+            bisect.insort(self._finish_order, new_key)
+            self._finish_keys[racer.id] = new_key
+        self._leaderboard_text = None
+
     # Actually enter the racer
     def _do_enter_racer(self, racer_member):
-        racer = Racer(racer_member)
-        if racer in self.racers:
+        racer = Racer(racer_member, self._on_racer_state_change)
+        if racer.id in self.racers:
             return
-        self.racers.append(racer)
+        self.racers[racer.id] = racer
+        self._racer_counts[racer.state] += 1
+        self._entry_count += 1
+        self._entry_numbers[racer.id] = self._entry_count
+        self._leaderboard_text = None
         self.room.notify(racer_member)
 
-    # Begins the race. Called by the countdown.
-    async def _begin_race(self):
-        for racer in self.racers:
+    # Begins the race, timed from the given system clock time (the deadline for the countdown's GO!). Called by the
+    # countdown.
+    async def _begin_race(self, start_time):
+        for racer in self.racers.values():
             if not racer.begin_race():
                 console.error("{} isn't ready while calling race._begin_race -- unexpected error.".format(
                     racer.name))
 
         self._status = RaceStatus.racing
-        self._adj_start_time = time.monotonic()
-        self._start_datetime = datetime.datetime.utcnow()
-        await self.room.write('GO!')
+        self._adj_start_time = start_time
+        self._last_resume_time = start_time
+        self._start_datetime = \
+            datetime.datetime.utcnow() + datetime.timedelta(seconds=start_time - time.monotonic())
         await self.room.update_leaderboard()
 
     # Checks to see if all racers have either finished or forfeited. If so, ends the race.
     # Return True if race was ended.
     async def _check_for_race_end(self):
-        for racer in self.racers:
-            if not racer.is_done_racing:
-                return False
+        if self.num_done_racing < len(self.racers):
+            return False
 
         await self._end_race()
         return True
@@ -530,45 +569,44 @@ class Race(object):
     # Countdown coroutine to be wrapped in self._countdown_future.
     # Warning: Do not call this -- use begin_countdown instead.
     async def _race_countdown(self):
-        countdown_systemtime_begin = time.monotonic()
-        countdown_timer = Config.COUNTDOWN_LENGTH
-        await asyncio.sleep(1)      # Pause before countdown
-
-        await self.room.write('The race will begin in {0} seconds.'.format(countdown_timer))
-        while countdown_timer > 0:
-            if countdown_timer <= Config.INCREMENTAL_COUNTDOWN_START:
-                await self.room.write('{}'.format(countdown_timer))
-            sleep_time = countdown_systemtime_begin + Config.COUNTDOWN_LENGTH - countdown_timer + 1 - time.monotonic()
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)         # sleep until the next tick
-            countdown_timer -= 1
+        intro_deadline = time.monotonic() + 1       # Pause before countdown
+        go_deadline = intro_deadline + Config.COUNTDOWN_LENGTH
+        ticks = [(intro_deadline, 'The race will begin in {0} seconds.'.format(Config.COUNTDOWN_LENGTH))]
+        for countdown_timer in range(min(Config.INCREMENTAL_COUNTDOWN_START, Config.COUNTDOWN_LENGTH), 0, -1):
+            ticks.append((go_deadline - countdown_timer, '{}'.format(countdown_timer)))
+
+        await Countdown(self._write_countdown_line, self._anchor_on(go_deadline)).run(ticks, go_deadline)
 
         # Begin the race.
-        await self._begin_race()
+        await self._begin_race(go_deadline)
 
     # Countdown for an unpause
     async def _unpause_countdown(self):
-        countdown_systemtime_begin = time.monotonic()
-        countdown_timer = Config.UNPAUSE_COUNTDOWN_LENGTH
-        await asyncio.sleep(1)      # Pause before countdown
-
-        while countdown_timer > 0:
-            await self.room.write('{}'.format(countdown_timer))
-            sleep_time = \
-                countdown_systemtime_begin + Config.UNPAUSE_COUNTDOWN_LENGTH - countdown_timer + 1 - time.monotonic()
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)         # sleep until the next tick
-            countdown_timer -= 1
+        go_deadline = time.monotonic() + 1 + Config.UNPAUSE_COUNTDOWN_LENGTH   # Pause before countdown
+        ticks = [(go_deadline - countdown_timer, '{}'.format(countdown_timer))
+                 for countdown_timer in range(Config.UNPAUSE_COUNTDOWN_LENGTH, 0, -1)]
+
+        await Countdown(self._write_countdown_line, self._anchor_on(go_deadline)).run(ticks, go_deadline)
 
         # Begin the race.
-        await self._do_unpause_race()
+        await self._do_unpause_race(go_deadline)
+
+    async def _write_countdown_line(self, text):
+        return await self.room.write(text, immediate=True)
+
+    # Returns a function that, given the GO! message for the given system clock time, takes that message's discord
+    # timestamp as the moment the timer (re)started
+    def _anchor_on(self, go_systemtime):
+        def set_anchor(go_message):
+            self._discord_anchor = (go_message.timestamp, go_systemtime)
+        return set_anchor
 
-    # Actually unpause the race
-    async def _do_unpause_race(self):
+    # Actually unpause the race, timed from the given system clock time (the deadline for the countdown's GO!)
+    async def _do_unpause_race(self, resume_time):
         if self._status == RaceStatus.paused:
-            await self.room.write('GO!')
             self._status = RaceStatus.racing
-            self._adj_start_time += time.monotonic() - self._last_pause_time
+            self._last_resume_time = resume_time
+            self._adj_start_time += resume_time - self._last_pause_time
             asyncio.ensure_future(self.room.update_leaderboard())
             return True
         return False
@@ -589,7 +627,9 @@ class Race(object):
         # Perform the finalization and record the race. At this point, the finalization cannot be cancelled.
         self._status = RaceStatus.finalized
         time_str = self.start_datetime.strftime("%d %B %Y, UTC %H:%M")
-        NecroDB().record_race(self)
+        record_time = await AsyncNecroDB().record_race(self)
+        console.info('Recorded race in {0} ({1} racers) in {2:.3f} s.'.format(
+            self.room.channel.name, len(self.racers), record_time))
         if self.race_info.post_results:
             await self.room.post_result(
                 'Race begun at {0}:\n```\n{1}{2}\n```'.format(
@@ -627,8 +667,35 @@ class Race(object):
                     return False
         return True
 
-    # Causes the racer to forfeit
-    async def _do_forfeit_racer(self, racer):
-        if racer.forfeit(self.current_time):
+    # Returns the system clock time at which a command sent at the given UTC datetime (discord's timestamp for the
+    # message) takes effect: when it was sent, rather than when the bot got around to it. Where possible this is
+    # measured from the discord timestamp of the last GO! message, so that both ends are stamped by the same clock;
+    # until that message has come back, the host clock stands in for discord's. The result is clamped to be no later
+    # than now, and no earlier than the race timer last started running. Since the host clock may be off, a time taken
+    # from it is also clamped to be no earlier than Config.MAX_COMMAND_LAG_SEC ago; a time measured from the GO! isn't,
+    # so that however far behind the bot falls, the lag never counts against a racer. If sent_at is None, returns the
+    # current time.
+    def _command_systemtime(self, sent_at):
+        now = time.monotonic()
+        if sent_at is None:
+            return now
+
+        if self._discord_anchor is not None:
+            anchor_datetime, anchor_systemtime = self._discord_anchor
+            systemtime = anchor_systemtime + (sent_at - anchor_datetime).total_seconds()
+            stats.observe('race.message_lag', now - systemtime)
+        else:
+            systemtime = now - (datetime.datetime.utcnow() - sent_at).total_seconds()
+            stats.observe('race.message_lag', now - systemtime)
+            systemtime = max(systemtime, now - Config.MAX_COMMAND_LAG_SEC)
+        return max(min(systemtime, now), self._last_resume_time)
+
+    # Causes the racer to forfeit (as of the given UTC datetime, if the race is running)
+    async def _do_forfeit_racer(self, racer, sent_at=None):
+        if self._status == RaceStatus.racing:
+            forfeit_time = self.race_time_at(self._command_systemtime(sent_at))
+        else:
+            forfeit_time = self.current_time
+        if racer.forfeit(forfeit_time):
             await self._check_for_race_end()
             await self.room.update_leaderboard()
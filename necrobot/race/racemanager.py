@@ -1,8 +1,11 @@
+import asyncio
 import discord
 from ..channel.raceroom import RaceRoom
 from ..channel.privateraceroom import PrivateRaceRoom
 from ..prefs.userprefs import UserPrefs
+from ..util import console
 from ..util.config import Config
+from ..util.fanout import FanOut
 
 
 class RaceManager(object):
@@ -37,7 +40,7 @@ class RaceManager(object):
     # Make a room with the given RaceInfo
     async def make_room(self, race_info):
         # Make a channel for the room
-        race_channel = await self.necrobot.client.create_channel(
+        race_channel = await self.necrobot.outbound.create_channel(
             self.necrobot.server,
             self.get_raceroom_name(race_info),
             type=discord.ChannelType.text)
@@ -49,26 +52,36 @@ class RaceManager(object):
 
             self.necrobot.register_bot_channel(race_channel, new_room)
 
-            # Send PM alerts
+            # Send PM alerts in the background, so the room can be used in the meantime
+            asyncio.ensure_future(self._send_race_alerts(race_channel, race_info))
+
+        return race_channel
+
+    # PM everyone with the race_alert preference about the new race. Runs in the background, so errors are logged here.
+    async def _send_race_alerts(self, race_channel, race_info):
+        try:
             alert_pref = UserPrefs()
             alert_pref.race_alert = True
 
             alert_string = 'A new race has been started:\nFormat: {1}\nChannel: {0}'.format(
                 race_channel.mention, race_info.format_str)
-            for user in self.necrobot.prefs_manager.get_all_matching(alert_pref):
-                await self.necrobot.client.send_message(user, alert_string)
-
-        return race_channel
+            recipients = await self.necrobot.prefs_manager.get_all_matching(alert_pref)
+            await FanOut(self.necrobot.outbound, 'race_alert').send_to_all(recipients, alert_string)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            console.error('Failed to send race alerts for {0}: {1}'.format(race_channel.name, e))
 
     async def close_room(self, race_room):
+        race_room.discard_pending_writes()
         race_channel = race_room.channel
         self.necrobot.unregister_bot_channel(race_channel)
-        await self.necrobot.client.delete_channel(race_channel)
+        await self.necrobot.outbound.delete_channel(race_channel)
 
     # Make a private race with the given RacePrivateInfo; give the given discord_member admin status
     async def make_private_room(self, race_private_info, discord_member):
         # Make a channel for the room
-        race_channel = await self.necrobot.client.create_channel(
+        race_channel = await self.necrobot.outbound.create_channel(
             self.necrobot.server,
             self.get_raceroom_name(race_private_info.race_info),
             type='text')
@@ -31,9 +31,13 @@ StatusStrs = {RacerStatus.unready: 'Not ready.',
 
 
 class Racer(object):
-    def __init__(self, member):
+    # member: [discord.Member]
+    # on_state_change: [function(Racer, RacerStatus, RacerStatus)] if given, called with the racer, its old state and its
+    #     new state whenever the racer's state changes
+    def __init__(self, member, on_state_change=None):
         self.member = member                    # the Discord member who is this racer
         self._state = RacerStatus.unready       # see RacerState notes above
+        self._on_state_change = on_state_change
         self.time = FIELD_UNKNOWN               # hundredths of a second
         self.igt = FIELD_UNKNOWN                # hundredths of a second
         self.level = FIELD_UNKNOWN              # level of death (or LEVEL_FINISHED or LEVEL_UNKNOWN_DEATH)
@@ -80,6 +84,10 @@ class Racer(object):
     def time_str(self):
         return racetime.to_str(self.time)
 
+    @property
+    def state(self):
+        return self._state
+
     @property
     def is_ready(self):
         return self._state == RacerStatus.ready
@@ -106,56 +114,62 @@ class Racer(object):
 
     def ready(self):
         if self._state == RacerStatus.unready:
-            self._state = RacerStatus.ready
+            self._set_state(RacerStatus.ready)
             return True
         return False
 
     def unready(self):
         if self._state == RacerStatus.ready:
-            self._state = RacerStatus.unready
+            self._set_state(RacerStatus.unready)
             return True
         return False
 
     def begin_race(self):
         if self._state == RacerStatus.ready:
-            self._state = RacerStatus.racing
+            self._set_state(RacerStatus.racing)
             return True
         return False
 
     def forfeit(self, time):
         if self._state == RacerStatus.racing or self._state == RacerStatus.finished:
-            self._state = RacerStatus.forfeit
             self.time = time
             self.level = LEVEL_UNKNOWN_DEATH
             self.igt = FIELD_UNKNOWN
+            self._set_state(RacerStatus.forfeit)
             return True
         return False
 
     def unforfeit(self):
         if self._state == RacerStatus.forfeit:
-            self._state = RacerStatus.racing
             self.time = FIELD_UNKNOWN
             self.igt = FIELD_UNKNOWN
             self.level = FIELD_UNKNOWN
+            self._set_state(RacerStatus.racing)
             return True
         return False
 
     def finish(self, time):
         if self._state == RacerStatus.racing or self._state == RacerStatus.forfeit:
-            self._state = RacerStatus.finished
             self.time = time
             self.level = LEVEL_FINISHED
+            self._set_state(RacerStatus.finished)
             return True
         return False
             
     def unfinish(self):
         if self._state == RacerStatus.finished:
-            self._state = RacerStatus.racing
             self.time = FIELD_UNKNOWN
             self.igt = FIELD_UNKNOWN
             self.level = FIELD_UNKNOWN
+            self._set_state(RacerStatus.racing)
             return True
         return False
 
     def add_comment(self, comment):
         self.comment = comment
+
+    def _set_state(self, state):
+        old_state = self._state
+        self._state = state
+        if self._on_state_change is not None:
+            self._on_state_change(self, old_state, state)
@@ -0,0 +1,83 @@
+# Buffers text written to a discord channel, and merges everything written within a short window into as few messages
+# as possible (each within Discord's message length limit), so that bursts of output cost fewer API requests.
+
+import asyncio
+import logging
+
+from .outbound import Priority
+
+MESSAGE_CHAR_LIMIT = 2000
+
+
+class CoalescingWriter(object):
+    # outbound: [OutboundScheduler]
+    # channel: [discord.Channel] the channel to write to
+    # window: [float] seconds to wait for more text before sending what has been written
+    def __init__(self, outbound, channel, window):
+        self.channel = channel
+        self._outbound = outbound
+        self._window = window
+        self._pending = []                  # texts written but not yet sent
+        self._flush_future = None           # the Future that sends _pending once the window has passed
+        self._send_lock = asyncio.Lock()    # held while sending, so that messages go out in the order written
+
+    # Write the given text. Normally the text is buffered and sent after the window (merged with whatever else is
+    # written in the meantime), and this returns None at once. If immediate is True, anything buffered is sent first
+    # and then the text is sent straight away, ahead of less urgent traffic, and this returns the discord.Message it
+    # was sent in; use this for timing-critical lines.
+    async def write(self, text, immediate=False):
+        if immediate:
+            self._cancel_flush()
+            messages = self._take_pending()
+            if messages:
+                # Shielded, so that cancelling this write (e.g. a countdown line) doesn't lose the buffered text too
+                await asyncio.shield(self._send(messages, Priority.countdown))
+            return await self._send([text], Priority.countdown)
+        else:
+            self._pending.append(text)
+            if self._flush_future is None:
+                self._flush_future = asyncio.ensure_future(self._flush_after_window())
+
+    # Send everything buffered now
+    async def flush(self):
+        self._cancel_flush()
+        await self._send(self._take_pending())
+
+    # Drop everything buffered without sending it
+    def discard(self):
+        self._cancel_flush()
+        self._pending = []
+
+    def _cancel_flush(self):
+        if self._flush_future is not None:
+            self._flush_future.cancel()
+            self._flush_future = None
+
+    # Remove the buffered texts, and return them merged into as few messages as possible
+    def _take_pending(self):
+        messages = []
+        for text in self._pending:
+            if messages and len(messages[-1]) + 1 + len(text) <= MESSAGE_CHAR_LIMIT:
+                messages[-1] += '\n' + text
+            else:
+                messages.append(text)
+        self._pending = []
+        return messages
+
+    # Send the messages in order, and return the last discord.Message sent (None if there were none)
+    async def _send(self, messages, priority=Priority.race):
+        sent = None
+        async with self._send_lock:
+            for message in messages:
+                sent = await self._outbound.send_message(self.channel, message, priority=priority)
+        return sent
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self._window)
+        self._flush_future = None   # from here on, the flush can't be cancelled
+        try:
+            await self._send(self._take_pending())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.getLogger('discord').exception('Exception while writing to #{0}.'.format(self.channel.name))
@@ -13,6 +13,9 @@ class Config(object):
     # minutes to allow for submissions on old dailies after new ones are rolled out
     DAILY_GRACE_PERIOD = int(60)
 
+    # maximum number of entries in each daily leaderboard message (longer leaderboards are split over several messages)
+    DAILY_LEADERBOARD_PAGE_SIZE = int(25)
+
     # number of seconds between the final .ready and race start
     COUNTDOWN_LENGTH = int(10)
     UNPAUSE_COUNTDOWN_LENGTH = int(3)
@@ -20,6 +23,11 @@ class Config(object):
     # number of seconds at which to start counting down each second in chat
     INCREMENTAL_COUNTDOWN_START = int(5)
 
+    # countdown lines are sent ahead of time by the measured send latency (starting from this guess), but never by more
+    # than the maximum
+    COUNTDOWN_INITIAL_LATENCY_SEC = float(0.2)
+    COUNTDOWN_MAX_LEAD_SEC = float(1)
+
     # seconds after race end to finalize+record race
     FINALIZE_TIME_SEC = int(30)
 
@@ -32,14 +40,45 @@ class Config(object):
     # give a warning re: cleaning race room if no entrants for this duration of time
     NO_ENTRANTS_CLEANUP_WARNING_SEC = int(90)
 
+    # .done, .forfeit and .pause take effect as of when they were sent. Until a race's GO! message has come back from
+    # discord, sent times are read against the host clock, and then count for at most this many seconds before the bot
+    # gets to the command (protects race times against a bad host clock)
+    MAX_COMMAND_LAG_SEC = float(2)
+
     # number of seconds to wait between allowing pokes
     RACE_POKE_DELAY = int(10)
 
+    # seconds to wait for more race room output before sending it, so that bursts are merged into one message
+    RACE_WRITE_COALESCE_SEC = float(0.3)
+
+    # minimum number of seconds between edits of a race room's topic (the leaderboard)
+    TOPIC_UPDATE_INTERVAL_SEC = float(3)
+
+    # maximum number of commands waiting to run in any one channel (further commands wait for room in the queue)
+    COMMAND_QUEUE_SIZE = int(100)
+
+    # maximum number of requests per second the bot sends to discord, across all channels. Discord allows a bot 50 per
+    # second globally; this stays a little under that, to leave room for requests discord.py makes on its own (e.g.
+    # retries after a 429) without sending a whole rollover's worth of PM alerts at a crawl.
+    OUTBOUND_GLOBAL_RATE = float(40)
+
+    # of the global requests per second above, the number that leaderboard updates and PM alerts may never use, so that
+    # a burst of them can't hold up race countdowns and race messages
+    OUTBOUND_RESERVED_TOKENS = int(10)
+
+    # PM fan-outs (e.g. race alerts): messages in flight at once, and attempts per recipient if rate limited
+    FANOUT_CONCURRENCY = int(10)
+    FANOUT_MAX_ATTEMPTS = int(4)
+    FANOUT_RETRY_BASE_SEC = float(1)
+
     # database
     MYSQL_DB_HOST = 'localhost'
     MYSQL_DB_USER = 'root'
     MYSQL_DB_PASSWD = ''
     MYSQL_DB_NAME = 'necrobot'
+    MYSQL_POOL_SIZE = int(5)                    # maximum number of open database connections
+    MYSQL_POOL_IDLE_TIMEOUT_SEC = int(300)      # idle connections older than this are closed instead of reused
+    USER_REGISTER_CHUNK_SIZE = int(500)         # maximum rows per INSERT when registering many users at once
 
     # login
     LOGIN_TOKEN = ''
@@ -52,6 +91,8 @@ def init(config_filename):
         'mysql_db_user': 'root',
         'mysql_db_passwd': '',
         'mysql_db_name': 'necrobot',
+        'mysql_pool_size': '5',
+        'mysql_pool_idle_timeout': '300',
         'login_token': '',
         'server_id': ''
         }
@@ -72,6 +113,8 @@ def init(config_filename):
     Config.MYSQL_DB_USER = defaults['mysql_db_user']
     Config.MYSQL_DB_PASSWD = defaults['mysql_db_passwd']
     Config.MYSQL_DB_NAME = defaults['mysql_db_name']
+    Config.MYSQL_POOL_SIZE = int(defaults['mysql_pool_size'])
+    Config.MYSQL_POOL_IDLE_TIMEOUT_SEC = int(defaults['mysql_pool_idle_timeout'])
     Config.LOGIN_TOKEN = defaults['login_token']
     Config.SERVER_ID = defaults['server_id']
 
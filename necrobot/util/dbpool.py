@@ -0,0 +1,100 @@
+# A bounded pool of persistent MySQL connections. Connections are handed out with connection() and returned to the pool
+# afterwards. A pooled connection is pinged every time it is handed out, and replaced if the server has dropped it, so
+# callers never see a connection that went stale while it sat in the pool; connections left idle for longer than
+# idle_timeout are not reused at all.
+
+import contextlib
+import queue
+import threading
+import time
+
+import mysql.connector
+
+
+class ConnectionPool(object):
+    # size: [int] the maximum number of connections open at once
+    # idle_timeout: [float] seconds a connection may sit unused before it is closed rather than reused
+    # connect_args: keyword arguments passed to mysql.connector.connect
+    def __init__(self, size, idle_timeout, **connect_args):
+        self._connect_args = connect_args
+        self._idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()                  # (connection, last-used monotonic time) pairs
+        self._slots = threading.BoundedSemaphore(size)  # one slot per connection that may be checked out
+
+    # Yields a live connection, and returns it to the pool afterwards. If the body raises a MySQL error, the
+    # connection is assumed to be unusable and is thrown away rather than being returned.
+    @contextlib.contextmanager
+    def connection(self):
+        db_conn = self._checkout()
+        try:
+            yield db_conn
+        except mysql.connector.Error:
+            self._discard(db_conn)
+            raise
+        except BaseException:
+            self._release(db_conn)
+            raise
+        else:
+            self._release(db_conn)
+
+    # Close every idle connection. (Connections currently checked out are unaffected.)
+    def close_all(self):
+        while True:
+            try:
+                db_conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_quietly(db_conn)
+
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            try:
+                db_conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_connection()
+
+            if time.monotonic() - last_used > self._idle_timeout:
+                self._close_quietly(db_conn)
+                return self._new_connection()
+
+            # The server may drop a connection at any time (a restart, a network blip, wait_timeout), so check every
+            # pooled connection before handing it out; a fresh one is made if it can't be revived
+            try:
+                db_conn.ping(reconnect=True, attempts=1)
+            except mysql.connector.Error:
+                self._close_quietly(db_conn)
+                return self._new_connection()
+            return db_conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _return(self, db_conn):
+        self._idle.put((db_conn, time.monotonic()))
+        self._slots.release()
+
+    # End any transaction left open (a plain SELECT opens one, and would otherwise pin a stale snapshot to this
+    # connection), then return the connection to the pool
+    def _release(self, db_conn):
+        try:
+            if db_conn.in_transaction:
+                db_conn.rollback()
+        except mysql.connector.Error:
+            self._discard(db_conn)
+        else:
+            self._return(db_conn)
+
+    def _discard(self, db_conn):
+        self._close_quietly(db_conn)
+        self._slots.release()
+
+    def _new_connection(self):
+        return mysql.connector.connect(**self._connect_args)
+
+    @staticmethod
+    def _close_quietly(db_conn):
+        try:
+            db_conn.close()
+        except mysql.connector.Error:
+            pass
@@ -0,0 +1,59 @@
+# Sends one message to many recipients (e.g. PM alerts), several at a time, retrying any that were rate limited.
+
+import asyncio
+import logging
+
+import discord
+from . import stats
+from .backoff import ExponentialBackoff
+from .config import Config
+from .outbound import Priority
+
+
+class FanOut(object):
+    # outbound: [OutboundScheduler]
+    # name: [string] used to name this job's stats and log lines, e.g. 'race_alert'
+    def __init__(self, outbound, name, priority=Priority.alert):
+        self._outbound = outbound
+        self._name = name
+        self._priority = priority
+        self.delivered = 0                  # number of recipients the message was sent to
+        self.failed = 0                     # number of recipients the message could not be sent to
+
+    # Send the content to every recipient, at most Config.FANOUT_CONCURRENCY at a time. Returns when every send has
+    # succeeded or failed; the counts are then in delivered and failed.
+    # recipients: [list<discord.User>]
+    # content: [string]
+    async def send_to_all(self, recipients, content):
+        semaphore = asyncio.Semaphore(Config.FANOUT_CONCURRENCY)
+        with stats.timed('fanout.{0}'.format(self._name)):
+            await asyncio.gather(*[self._send_one(semaphore, recipient, content) for recipient in recipients])
+
+        stats.increment('fanout.{0}.delivered'.format(self._name), self.delivered)
+        stats.increment('fanout.{0}.failed'.format(self._name), self.failed)
+        logging.getLogger('discord').info('Sent {0}: {1} delivered, {2} failed.'.format(
+            self._name, self.delivered, self.failed))
+
+    async def _send_one(self, semaphore, recipient, content):
+        async with semaphore:
+            backoff = ExponentialBackoff(Config.FANOUT_RETRY_BASE_SEC)
+            for attempt in range(Config.FANOUT_MAX_ATTEMPTS):
+                try:
+                    await self._outbound.send_message(recipient, content, priority=self._priority)
+                    self.delivered += 1
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except discord.HTTPException as e:
+                    if not _is_rate_limited(e) or attempt + 1 == Config.FANOUT_MAX_ATTEMPTS:
+                        break
+                    await asyncio.sleep(backoff.delay())
+                except Exception:
+                    logging.getLogger('discord').exception(
+                        'Exception while sending {0} to {1}.'.format(self._name, recipient.id))
+                    break
+            self.failed += 1
+
+
+def _is_rate_limited(http_exception):
+    return getattr(http_exception.response, 'status', None) == 429
@@ -0,0 +1,217 @@
+# Central scheduler for everything the bot writes to discord. Requests are queued by priority and sent as rate limits
+# allow: each route (e.g. messages to one channel, or edits of one channel) has its own token bucket, and all requests
+# share a global one. Whenever a request can be sent, the highest-priority one that is ready goes first, so that e.g.
+# race countdowns never wait behind a blast of PM alerts. Leaderboard and alert requests also leave the last
+# Config.OUTBOUND_RESERVED_TOKENS global tokens alone, so a blast that has drained the global bucket still leaves
+# room for a countdown line to go out at once.
+#
+# Requests on the same route are sent one at a time, so messages to one channel arrive in the order they were queued
+# (among requests of the same priority).
+
+import asyncio
+import bisect
+import itertools
+import time
+from enum import IntEnum
+
+from . import stats
+from .config import Config
+
+
+class Priority(IntEnum):
+    countdown = 0       # race countdowns and GO!
+    race = 1            # race state messages, and replies to commands
+    leaderboard = 2     # race room topics, race results and daily leaderboards
+    alert = 3           # PM alerts and other bulk notifications
+
+# (tokens per second, burst size) for each kind of route
+ROUTE_LIMITS = {
+    'send_message': (1.0, 5),
+    'edit_message': (1.0, 5),
+    'delete_message': (1.0, 5),
+    'edit_channel': (0.5, 2),
+    'create_channel': (0.5, 2),
+    'delete_channel': (0.5, 2),
+    'edit_channel_permissions': (2.0, 10),
+    'create_role': (0.5, 2),
+    'edit_member_roles': (1.0, 5),
+}
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        self._rate = rate                   # tokens added per second
+        self._capacity = capacity           # maximum number of tokens
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+
+    # Seconds until a token will be available (0 if one is available now), while leaving reserve tokens in the bucket
+    def time_until_available(self, now, reserve=0):
+        self._refill(now)
+        needed = 1 + reserve
+        return 0.0 if self._tokens >= needed else (needed - self._tokens) / self._rate
+
+    def take(self, now):
+        self._refill(now)
+        self._tokens -= 1
+
+    def _refill(self, now):
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+
+class _Request(object):
+    def __init__(self, priority, seq, route, send):
+        self.priority = priority
+        self.seq = seq                      # tiebreaker, so requests of equal priority go in the order queued
+        self.route = route
+        self.send = send                    # function returning the coroutine that makes the API call
+        self.future = asyncio.Future()
+        self.enqueue_time = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler(object):
+    # client: [discord.Client]
+    def __init__(self, client):
+        self._client = client
+        self._pending = []                  # queued _Requests, sorted by priority and then by order queued
+        self._busy_routes = set()           # routes with a request currently in flight
+        self._route_buckets = {}            # maps routes onto TokenBuckets
+        self._global_bucket = TokenBucket(
+            Config.OUTBOUND_GLOBAL_RATE, max(Config.OUTBOUND_GLOBAL_RATE, Config.OUTBOUND_RESERVED_TOKENS + 1))
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()      # set whenever a request is queued or a route frees up
+        self._dispatcher = None             # the Future running _dispatch
+
+    # The number of requests waiting to be sent
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    async def send_message(self, destination, content, priority=Priority.race):
+        return await self._submit(
+            ('send_message', destination.id), priority,
+            lambda: self._client.send_message(destination, content))
+
+    async def edit_message(self, message, new_content, priority=Priority.leaderboard):
+        return await self._submit(
+            ('edit_message', message.channel.id), priority,
+            lambda: self._client.edit_message(message, new_content))
+
+    async def delete_message(self, message, priority=Priority.leaderboard):
+        return await self._submit(
+            ('delete_message', message.channel.id), priority,
+            lambda: self._client.delete_message(message))
+
+    async def edit_channel(self, channel, priority=Priority.leaderboard, **options):
+        return await self._submit(
+            ('edit_channel', channel.id), priority,
+            lambda: self._client.edit_channel(channel, **options))
+
+    async def create_channel(self, server, name, *overwrites, priority=Priority.race, **kwargs):
+        return await self._submit(
+            ('create_channel', server.id), priority,
+            lambda: self._client.create_channel(server, name, *overwrites, **kwargs))
+
+    async def delete_channel(self, channel, priority=Priority.race):
+        return await self._submit(
+            ('delete_channel', channel.server.id), priority,
+            lambda: self._client.delete_channel(channel))
+
+    async def edit_channel_permissions(self, channel, target, overwrite=None, priority=Priority.race):
+        return await self._submit(
+            ('edit_channel_permissions', channel.id), priority,
+            lambda: self._client.edit_channel_permissions(channel, target, overwrite))
+
+    async def create_role(self, server, priority=Priority.alert, **fields):
+        return await self._submit(
+            ('create_role', server.id), priority,
+            lambda: self._client.create_role(server, **fields))
+
+    async def add_roles(self, member, *roles, priority=Priority.alert):
+        return await self._submit(
+            ('edit_member_roles', member.server.id), priority,
+            lambda: self._client.add_roles(member, *roles))
+
+    async def remove_roles(self, member, *roles, priority=Priority.alert):
+        return await self._submit(
+            ('edit_member_roles', member.server.id), priority,
+            lambda: self._client.remove_roles(member, *roles))
+
+    # Queue a request, and wait for its result
+    async def _submit(self, route, priority, send):
+        request = _Request(priority, next(self._seq), route, send)
+        bisect.insort(self._pending, request)
+        stats.observe('outbound.depth', len(self._pending))
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        self._wakeup.set()
+        return await request.future
+
+    # Starts requests as their rate limits allow, highest priority first
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            wait_time = self._global_bucket.time_until_available(now)
+            request = None
+            if wait_time <= 0:
+                wait_time = None
+                for i, candidate in enumerate(self._pending):
+                    if candidate.future.done():         # the caller gave up on it
+                        del self._pending[i]
+                        request = candidate
+                        break
+                    if candidate.route in self._busy_routes:
+                        continue
+                    candidate_wait = max(
+                        self._bucket(candidate.route).time_until_available(now),
+                        self._global_bucket.time_until_available(now, _reserved_tokens(candidate.priority)))
+                    if candidate_wait <= 0:
+                        del self._pending[i]
+                        request = candidate
+                        break
+                    wait_time = candidate_wait if wait_time is None else min(wait_time, candidate_wait)
+
+            if request is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+            elif not request.future.done():
+                self._global_bucket.take(now)
+                self._bucket(request.route).take(now)
+                self._busy_routes.add(request.route)
+                asyncio.ensure_future(self._run(request))
+
+    async def _run(self, request):
+        stats.observe('outbound.wait.{0}'.format(request.priority.name), time.monotonic() - request.enqueue_time)
+        try:
+            result = await request.send()
+        except asyncio.CancelledError:
+            request.future.cancel()
+            raise
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            self._busy_routes.discard(request.route)
+            self._wakeup.set()
+
+    def _bucket(self, route):
+        if route not in self._route_buckets:
+            rate, capacity = ROUTE_LIMITS[route[0]]
+            self._route_buckets[route] = TokenBucket(rate, capacity)
+        return self._route_buckets[route]
+
+
+# Returns the number of global tokens that requests of the given priority must leave in the bucket
+def _reserved_tokens(priority):
+    return Config.OUTBOUND_RESERVED_TOKENS if priority >= Priority.leaderboard else 0
@@ -0,0 +1,85 @@
+# Running counters and timings for keeping an eye on the bot's hot paths. Everything is kept in memory and reset on
+# restart; use the `.stats` admin command to see the current values.
+
+import threading
+import time
+
+_lock = threading.Lock()    # stats may be recorded from the database threads as well as the event loop
+_counters = {}              # maps names onto ints
+_observations = {}          # maps names onto Observations
+
+
+# Summary of a series of observed values (e.g. durations, in seconds)
+class Observation(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.last = value
+
+
+# Context manager which observes the seconds spent in its body under the given name. The elapsed time is also
+# available afterwards as the attribute 'elapsed'.
+class timed(object):
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+        self._begin = 0.0
+
+    def __enter__(self):
+        self._begin = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed = time.monotonic() - self._begin
+        observe(self.name, self.elapsed)
+        return False
+
+
+# Add amount to the counter with the given name
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+# Return the current value of the given counter
+def count(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+# Record one value for the given observation
+def observe(name, value):
+    with _lock:
+        if name not in _observations:
+            _observations[name] = Observation()
+        _observations[name].add(value)
+
+
+# Return the Observation with the given name, or None if nothing has been observed under that name
+def get(name):
+    with _lock:
+        return _observations.get(name)
+
+
+# Return a list of strings, one per counter or observation, sorted by name
+def summary_lines():
+    lines = []
+    with _lock:
+        for name, value in _counters.items():
+            lines.append('{0}: {1}'.format(name, value))
+        for name, obs in _observations.items():
+            lines.append('{0}: n={1} mean={2:.4f} max={3:.4f} last={4:.4f}'.format(
+                name, obs.count, obs.mean, obs.max, obs.last))
+    lines.sort()
+    return lines
@@ -0,0 +1,131 @@
+# Measures how many messages per second a race room can dispatch, using fake discord objects (no connection needed).
+# Compares the old dispatch, which awaited every CommandType in turn, against the lookup by command name, both calling
+# the room directly (the cost of the lookup alone) and going through Necrobot.execute and the room's command queue
+# (the cost with the queue hop, which is the same for both).
+# Run from the repository root: python -m otherscripts.benchmark_dispatch
+
+import asyncio
+import time
+
+from necrobot.channel.raceroom import RaceRoom
+from necrobot.command.command import Command
+from necrobot.necrobot import Necrobot
+from necrobot.race.raceinfo import RaceInfo
+
+NUM_MESSAGES = 100000
+
+# A mix of race-room commands and chatter that merely starts with the prefix
+MESSAGE_CONTENTS = ['.shame', '.time', '.notacommand', '.missing', '...']
+
+
+class FakeUser(object):
+    def __init__(self, user_id):
+        self.id = str(user_id)
+        self.name = 'user{0}'.format(user_id)
+        self.display_name = self.name
+        self.mention = '<@{0}>'.format(user_id)
+        self.roles = []
+
+
+class FakeChannel(object):
+    def __init__(self, channel_id, name):
+        self.id = str(channel_id)
+        self.name = name
+        self.is_private = False
+
+
+class FakeMessage(object):
+    def __init__(self, content, author, channel):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.server = None
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.user = FakeUser(1)
+
+    async def send_message(self, destination, content):
+        pass
+
+    async def edit_channel(self, channel, **options):
+        pass
+
+
+class FakeRaceManager(object):
+    def __init__(self, necrobot):
+        self.necrobot = necrobot
+
+
+class FakeRace(object):
+    before_race = True
+    complete = False
+    racers = {}
+
+
+def make_commands(channel):
+    author = FakeUser(2)
+    return [Command(FakeMessage(MESSAGE_CONTENTS[i % len(MESSAGE_CONTENTS)], author, channel))
+            for i in range(NUM_MESSAGES)]
+
+
+async def old_execute(bot_channel, command):
+    for cmd_type in bot_channel.command_types:
+        await cmd_type.execute(command)
+
+
+def run_benchmark():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    necrobot = Necrobot(FakeClient())
+    channel = FakeChannel(10, 'cadence-1')
+    room = RaceRoom(FakeRaceManager(necrobot), channel, RaceInfo())
+    room._current_race = FakeRace()
+    necrobot.register_bot_channel(channel, room)
+    commands = make_commands(channel)
+
+    async def run_direct(execute):
+        for command in commands:
+            await execute(command)
+
+    async def run_queued(execute):
+        room.execute = execute      # the room's command worker calls this for each command
+        try:
+            for command in commands:
+                await necrobot.execute(command)
+            # a room's command worker exits once its queue has run empty
+            # noinspection PyProtectedMember
+            await asyncio.wait(list(room._command_workers.values()))
+        finally:
+            del room.execute
+
+    async def old_dispatch(command):
+        await old_execute(room, command)
+
+    new_dispatch = room.execute
+    for name, coro_fn, execute in [
+            ('old dispatch, direct', run_direct, old_dispatch),
+            ('new dispatch, direct', run_direct, new_dispatch),
+            ('old dispatch, through queue', run_queued, old_dispatch),
+            ('new dispatch, through queue', run_queued, new_dispatch)]:
+        begin = time.perf_counter()
+        loop.run_until_complete(coro_fn(execute))
+        elapsed = time.perf_counter() - begin
+        print('{0}: {1:.0f} messages/s'.format(name, NUM_MESSAGES / elapsed))
+
+    # Drop the room's output, which is still waiting on the outbound rate limits
+    room.discard_pending_writes()
+    room.stop_command_queue()
+    all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks     # moved in Python 3.7
+    pending = list(all_tasks(loop))
+    for task in pending:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    loop.close()
+
+# ------------------------
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,106 @@
+# Times PrefsManager.get_all_matching on a synthetic server, against the old approach (walk every member for every
+# matching database row, then intersect the result lists). No database or discord connection is needed.
+# Run from the repository root: python -m otherscripts.benchmark_prefsmatching
+
+import asyncio
+import random
+import time
+
+from necrobot.prefs.prefsmanager import PrefsManager
+from necrobot.prefs.userprefs import UserPrefs
+
+NUM_MEMBERS = 10000
+RACE_ALERT_FRACTION = 0.2
+DAILY_ALERT_FRACTION = 0.3
+
+
+class FakeMember(object):
+    def __init__(self, member_id):
+        self.id = str(member_id)
+
+
+class FakeServer(object):
+    def __init__(self, members):
+        self.members = members
+
+
+class FakeNecrobot(object):
+    def __init__(self, members):
+        self.server = FakeServer(members)
+        self._members_by_id = {int(member.id): member for member in members}
+
+    def get_member_by_id(self, user_id):
+        return self._members_by_id.get(int(user_id))
+
+
+# The pre-index implementation, given the rows the database would have returned
+def old_get_all_matching(server, dailyalert_rows, racealert_rows):
+    lists_to_use = []
+    for rows in [dailyalert_rows, racealert_rows]:
+        users_matching_pref = []
+        lists_to_use.append(users_matching_pref)
+        for row in rows:
+            for member in server.members:
+                if int(member.id) == int(row[0]):
+                    users_matching_pref.append(member)
+
+    users_matching = []
+    for member in lists_to_use[0]:
+        in_intersection = True
+        for l in lists_to_use:
+            if member not in l:
+                in_intersection = False
+        if in_intersection:
+            users_matching.append(member)
+    return users_matching
+
+
+def run_benchmark():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    rand = random.Random(0)
+    members = [FakeMember(100000 + i) for i in range(NUM_MEMBERS)]
+    necrobot = FakeNecrobot(members)
+
+    prefs_manager = PrefsManager(necrobot)
+    prefs_manager._loaded = True
+    dailyalert_rows = []
+    racealert_rows = []
+    for member in members:
+        prefs = UserPrefs()
+        prefs.daily_alert = rand.random() < DAILY_ALERT_FRACTION
+        prefs.race_alert = rand.random() < RACE_ALERT_FRACTION
+        prefs_manager._store(int(member.id), prefs)
+        if prefs.daily_alert:
+            dailyalert_rows.append((int(member.id),))
+        if prefs.race_alert:
+            racealert_rows.append((int(member.id),))
+
+    to_match = UserPrefs()
+    to_match.daily_alert = True
+    to_match.race_alert = True
+
+    begin = time.perf_counter()
+    old_result = old_get_all_matching(necrobot.server, dailyalert_rows, racealert_rows)
+    old_time = time.perf_counter() - begin
+
+    repeats = 100
+    begin = time.perf_counter()
+    for _ in range(repeats):
+        new_result = loop.run_until_complete(prefs_manager.get_all_matching(to_match))
+    new_time = (time.perf_counter() - begin) / repeats
+    loop.close()
+
+    # noinspection PyUnboundLocalVariable
+    assert set(m.id for m in old_result) == set(m.id for m in new_result)
+    print('{0} members, {1} daily-alert and {2} race-alert subscribers, {3} matching both'.format(
+        NUM_MEMBERS, len(dailyalert_rows), len(racealert_rows), len(new_result)))
+    print('old: {0:.4f} s'.format(old_time))
+    print('new: {0:.6f} s'.format(new_time))
+    print('speedup: {0:.0f}x'.format(old_time / new_time))
+
+# ------------------------
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,29 @@
+import mysql.connector
+from necrobot.util import config
+from necrobot.util.config import Config
+
+
+# Move daily leaderboard message ids out of daily_data.msg_id and into the daily_leaderboard_msgs table, which stores
+# one message id per page of each leaderboard. Existing leaderboards become page 0.
+def migrate_leaderboard_pages():
+    cnx = mysql.connector.connect(user=Config.MYSQL_DB_USER, password=Config.MYSQL_DB_PASSWD,
+                                  host=Config.MYSQL_DB_HOST,
+                                  database=Config.MYSQL_DB_NAME)
+    cursor = cnx.cursor()
+    cursor.execute("""CREATE TABLE IF NOT EXISTS daily_leaderboard_msgs
+                    (daily_id INT,
+                    type INT,
+                    page INT,
+                    msg_id BIGINT,
+                    PRIMARY KEY (daily_id, type, page)) ENGINE=InnoDB""")
+    cursor.execute("""INSERT IGNORE INTO daily_leaderboard_msgs (daily_id, type, page, msg_id)
+                    SELECT daily_id, type, 0, msg_id FROM daily_data WHERE msg_id IS NOT NULL AND msg_id != 0""")
+    cursor.execute("ALTER TABLE daily_data DROP COLUMN msg_id")
+    cnx.commit()
+    cnx.close()
+
+# ------------------------
+
+if __name__ == "__main__":
+    config.init('data/bot_config')
+    migrate_leaderboard_pages()
@@ -0,0 +1,30 @@
+import mysql.connector
+from necrobot.util import config
+from necrobot.util.config import Config
+
+
+# Make race_data.race_id an AUTO_INCREMENT column, so that new race ids are allocated by the database rather than by
+# reading the largest existing id. Existing ids are kept; the counter continues from the largest one.
+def migrate_race_id():
+    cnx = mysql.connector.connect(user=Config.MYSQL_DB_USER, password=Config.MYSQL_DB_PASSWD,
+                                  host=Config.MYSQL_DB_HOST,
+                                  database=Config.MYSQL_DB_NAME)
+    cursor = cnx.cursor()
+
+    # The first race ever recorded has race_id 0; without this, MySQL would renumber it when the column becomes
+    # AUTO_INCREMENT, orphaning its rows in racer_data.
+    cursor.execute("SELECT @@SESSION.sql_mode")
+    sql_modes = [mode for mode in cursor.fetchone()[0].split(',') if mode]
+    sql_modes.append('NO_AUTO_VALUE_ON_ZERO')
+    cursor.execute("SET SESSION sql_mode = %s", (','.join(sql_modes),))
+
+    cursor.execute("ALTER TABLE race_data MODIFY race_id INT NOT NULL AUTO_INCREMENT")
+    cursor.execute("ALTER TABLE racer_data MODIFY race_id INT NOT NULL")
+    cnx.commit()
+    cnx.close()
+
+# ------------------------
+
+if __name__ == "__main__":
+    config.init('data/bot_config')
+    migrate_race_id()
@@ -22,8 +22,13 @@ def make_new_database():
                     (daily_id INT,
                     type INT,
                     seed INT,
-                    msg_id BIGINT,
                     PRIMARY KEY (daily_id, type)) ENGINE=InnoDB""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS daily_leaderboard_msgs
+                    (daily_id INT,
+                    type INT,
+                    page INT,
+                    msg_id BIGINT,
+                    PRIMARY KEY (daily_id, type, page)) ENGINE=InnoDB""")
     cursor.execute("""CREATE TABLE IF NOT EXISTS daily_races
                     (discord_id BIGINT,
                     daily_id INT,
@@ -32,7 +37,7 @@ def make_new_database():
                     time INT,
                     PRIMARY KEY (discord_id, daily_id, type)) ENGINE=InnoDB""")
     cursor.execute("""CREATE TABLE IF NOT EXISTS race_data
-                    (race_id INT,
+                    (race_id INT NOT NULL AUTO_INCREMENT,
                     timestamp DATETIME,
                     character_name VARCHAR(50),
                     descriptor VARCHAR(100),
@@ -0,0 +1,96 @@
+# Tests for BotChannel's command queues. Run from the repository root: python -m unittest discover tests
+
+import asyncio
+import unittest
+
+from necrobot.channel.botchannel import BotChannel
+from necrobot.util.config import Config
+
+
+class FakeAuthor(object):
+    def __init__(self, author_id):
+        self.id = str(author_id)
+
+
+class FakeCommand(object):
+    def __init__(self, number, author_id=1):
+        self.number = number
+        self.command = 'fake'
+        self.author = FakeAuthor(author_id)
+
+
+# Records the order commands ran in. Commands finish without yielding to the event loop, so that a worker can run its
+# queue empty before any enqueue blocked on the full queue has resumed.
+class RecordingBotChannel(BotChannel):
+    def __init__(self):
+        BotChannel.__init__(self, None)
+        self.executed = []
+
+    async def execute(self, command):
+        self.executed.append(command.number)
+
+    def _command_queue_key(self, command):
+        return command.author.id
+
+
+class TestCommandQueue(unittest.TestCase):
+    def setUp(self):
+        self._old_queue_size = Config.COMMAND_QUEUE_SIZE
+        Config.COMMAND_QUEUE_SIZE = 3
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        Config.COMMAND_QUEUE_SIZE = self._old_queue_size
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_until_settled(self, coro):
+        self.loop.run_until_complete(asyncio.wait_for(coro, 5))
+
+    def test_overflowing_queue_runs_every_command_in_order(self):
+        channel = RecordingBotChannel()
+
+        async def overflow():
+            await asyncio.gather(*[channel.enqueue(FakeCommand(i)) for i in range(8)])
+            while channel.command_queue_depth or channel._command_workers:
+                await asyncio.sleep(0)
+
+        self.run_until_settled(overflow())
+        self.assertEqual(channel.executed, list(range(8)))
+
+    def test_queue_restarts_after_running_empty(self):
+        channel = RecordingBotChannel()
+
+        async def two_bursts():
+            for burst in [range(0, 5), range(5, 10)]:
+                await asyncio.gather(*[channel.enqueue(FakeCommand(i)) for i in burst])
+                while channel._command_workers:
+                    await asyncio.sleep(0)
+
+        self.run_until_settled(two_bursts())
+        self.assertEqual(channel.executed, list(range(10)))
+
+    def test_keys_run_independently(self):
+        channel = RecordingBotChannel()
+
+        async def interleaved():
+            await asyncio.gather(*[channel.enqueue(FakeCommand(i, author_id=i % 2)) for i in range(8)])
+            while channel._command_workers:
+                await asyncio.sleep(0)
+
+        self.run_until_settled(interleaved())
+        self.assertEqual([i for i in channel.executed if i % 2 == 0], [0, 2, 4, 6])
+        self.assertEqual([i for i in channel.executed if i % 2 == 1], [1, 3, 5, 7])
+
+    def test_stop_unblocks_commands_waiting_for_room(self):
+        channel = RecordingBotChannel()
+
+        async def stop_while_full():
+            enqueues = asyncio.gather(*[channel.enqueue(FakeCommand(i)) for i in range(8)])
+            await asyncio.sleep(0)
+            channel.stop_command_queue()
+            await enqueues
+
+        self.run_until_settled(stop_while_full())
+        self.assertLess(len(channel.executed), 8)